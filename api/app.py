@@ -3,10 +3,22 @@ Flask API for AskAlma RAG System
 Connects React frontend to the conversation-enabled RAG backend
 """
 
-from flask import Flask, request, jsonify, send_from_directory, make_response
+from flask import Flask, Response, request, jsonify, stream_with_context
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 import sys
 import os
+import atexit
+import hashlib
+import logging
+import queue
+import uuid
+from contextlib import closing
+from itertools import islice
+from operator import itemgetter
+from logging.handlers import QueueHandler, QueueListener
+import orjson
+from decimal import Decimal
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 from typing import List
@@ -21,18 +33,131 @@ else:
 
 # Add parent directory to path to import rag_query
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from src.embedder.rag_query import rag_answer, get_conversation_history, get_pg_conn
+from src.embedder.rag_query import (
+    rag_answer,
+    rag_answer_stream,
+    get_conversation_history,
+    invalidate_conversation_history,
+    execute_prepared,
+    pg_conn,
+)
+
+
+
+def _orjson_default(obj):
+    # Mirror Flask's default provider for the types orjson doesn't handle natively
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if hasattr(obj, "__html__"):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class OrjsonProvider(JSONProvider):
+    """
+    JSON provider backed by orjson for jsonify() and request.json.
+    Serializes datetimes (ISO 8601, same as .isoformat()), UUIDs and numpy
+    arrays natively, so handlers can return database values as-is.
+    """
+
+    def dumpb(self, obj) -> bytes:
+        return orjson.dumps(obj, default=_orjson_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+    def dumps(self, obj, **kwargs) -> str:
+        return self.dumpb(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs) -> Response:
+        # jsonify(): hand orjson's bytes straight to the response instead of
+        # decoding to str only for Werkzeug to encode it back
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumpb(obj) + b"\n", mimetype="application/json")
+
+
+# Only /api/* is served here; the React build is served by nginx (nginx.conf)
+# or by Vercel's static build.
+app = Flask(__name__, static_folder=None)
+app.json = OrjsonProvider(app)
+# -------------------------------
+# Error logging
+# -------------------------------
+class _JsonLineFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, message, err_id, traceback."""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'err_id', None):
+            entry['err_id'] = record.err_id
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return orjson.dumps(entry).decode()
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that enqueues the raw record. The stock prepare() formats
+    the message (and traceback) on the calling thread; here that work is left
+    to the listener thread so request threads only pay for a queue put.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+log = logging.getLogger('askalma')
+log.setLevel(logging.INFO)
+log.propagate = False
+_log_queue = queue.SimpleQueue()
+_log_stream = logging.StreamHandler(sys.stderr)
+_log_stream.setFormatter(_JsonLineFormatter())
+log.addHandler(_DeferredQueueHandler(_log_queue))
+_log_listener = QueueListener(_log_queue, _log_stream)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+
+def _internal_error(event: str, message: str):
+    """
+    Log the exception being handled (off-thread) and build a 500 response
+    that carries only a short error ID the client can report.
+    """
+    err_id = uuid.uuid4().hex[:12]
+    log.exception(event, extra={'err_id': err_id})
+    return jsonify({'error': message, 'err_id': err_id}), 500
+
 
-app = Flask(__name__, static_folder='../frontend/build', static_url_path='')
 # Enable CORS for React frontend with explicit origins
 CORS(app, resources={
     r"/api/*": {
         "origins": ["http://localhost:3000", "http://127.0.0.1:3000", "*"],
-        "methods": ["GET", "POST", "PATCH", "DELETE", "OPTIONS"],
+        "methods": ["GET", "POST", "PATCH", "DELETE"],
         "allow_headers": ["Content-Type", "Authorization"]
     }
 })
 
+# Preflight answer for /api/*, matching the CORS policy above ("*" is an
+# allowed origin, so it is echoed as-is). Max-Age lets browsers skip repeat
+# preflights for a day.
+PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PATCH, DELETE',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+    'Access-Control-Max-Age': '86400',
+}
+
+
+@app.before_request
+def _cors_preflight():
+    """Answer CORS preflights before route dispatch and Flask-CORS matching."""
+    if request.method == 'OPTIONS' and request.path.startswith('/api/'):
+        return '', 204, PREFLIGHT_HEADERS
+
 
 def _normalize_string_list(value) -> List[str]:
     """
@@ -41,6 +166,12 @@ def _normalize_string_list(value) -> List[str]:
     """
     if value is None:
         return []
+    if isinstance(value, list):
+        # Common case: the frontend sends a list of strings
+        try:
+            return [text for text in map(str.strip, value) if text]
+        except TypeError:
+            pass  # mixed item types, handled by the general loop below
     if isinstance(value, str):
         parts = [part.strip() for part in value.split(",")]
         return [part for part in parts if part]
@@ -57,39 +188,36 @@ def _normalize_string_list(value) -> List[str]:
     return [text] if text else []
 
 
+# Columns returned by the profile endpoints, in payload order
+_PROFILE_FIELDS = (
+    'user_id', 'school', 'academic_year', 'major', 'minors',
+    'classes_taken', 'profile_image', 'created_at', 'updated_at',
+)
+_PROFILE_COLUMNS = ", ".join(_PROFILE_FIELDS)
+_get_profile_fields = itemgetter(*_PROFILE_FIELDS)
+
+
 def _serialize_profile(row):
-    """Convert database row into JSON-friendly profile payload."""
+    """Convert a profile row (RealDictCursor) into a JSON-friendly payload."""
     if not row:
         return None
-    
-    # Handle both dict (RealDictCursor) and tuple (regular cursor) formats
-    if isinstance(row, dict):
-        return {
-            'user_id': row.get('user_id'),
-            'school': row.get('school'),
-            'academic_year': row.get('academic_year'),
-            'major': row.get('major'),
-            'minors': row.get('minors') or [],
-            'classes_taken': row.get('classes_taken') or [],
-            'profile_image': row.get('profile_image'),
-            'created_at': row.get('created_at').isoformat() if row.get('created_at') else None,
-            'updated_at': row.get('updated_at').isoformat() if row.get('updated_at') else None,
-        }
-    else:
-        # Handle tuple format
-        columns = ['user_id', 'school', 'academic_year', 'major', 'minors', 'classes_taken', 'profile_image', 'created_at', 'updated_at']
-        row_dict = dict(zip(columns, row))
-        return {
-            'user_id': row_dict.get('user_id'),
-            'school': row_dict.get('school'),
-            'academic_year': row_dict.get('academic_year'),
-            'major': row_dict.get('major'),
-            'minors': row_dict.get('minors') or [],
-            'classes_taken': row_dict.get('classes_taken') or [],
-            'profile_image': row_dict.get('profile_image'),
-            'created_at': row_dict.get('created_at').isoformat() if row_dict.get('created_at') else None,
-            'updated_at': row_dict.get('updated_at').isoformat() if row_dict.get('updated_at') else None,
-        }
+    profile = dict(zip(_PROFILE_FIELDS, _get_profile_fields(row)))
+    profile['minors'] = profile['minors'] or []
+    profile['classes_taken'] = profile['classes_taken'] or []
+    return profile
+
+
+def _profile_response(profile):
+    """
+    JSON response for a serialized profile, tagged with an ETag over its
+    content. A GET whose If-None-Match still matches gets an empty 304.
+    """
+    body = app.json.dumpb(profile)
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(hashlib.blake2b(body, digest_size=8).hexdigest())
+    # Let browsers keep the copy but revalidate it (If-None-Match) every time
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 
 @app.route('/api/health', methods=['GET'])
@@ -101,6 +229,24 @@ def health_check():
     })
 
 
+def _format_sources(matches) -> List[dict]:
+    """Top 5 retrieved chunks, trimmed to a preview for the frontend."""
+    # similarity is already a Python float (float8 from psycopg2 or the
+    # cache), and the preview is a plain slice; add any ellipsis client-side.
+    return [
+        {
+            'id': match['id'],
+            'similarity': match['similarity'],
+            'content': match['content'][:200]  # Preview only
+        }
+        for match in islice(matches, 5)
+    ]
+
+
+def _sse(payload: dict) -> str:
+    return f"data: {app.json.dumps(payload)}\n\n"
+
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """
@@ -148,25 +294,67 @@ def chat():
         response = {
             'conversation_id': result['conversation_id'],
             'answer': result['answer'],
-            'sources': [
-                {
-                    'id': match['id'],
-                    'similarity': float(match['similarity']),
-                    'content': match['content'][:200] + '...'  # Preview only
-                }
-                for match in result['matches'][:5]  # Top 5 sources
-            ],
+            'sources': _format_sources(result['matches']),
             'model': result['used_model_llm']
         }
         
         return jsonify(response)
     
-    except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"Error in /api/chat: {e}")
-        print(f"Full traceback:\n{error_trace}")
-        return jsonify({'error': str(e), 'traceback': error_trace}), 500
+    except Exception:
+        return _internal_error('chat_failed', 'Failed to generate an answer')
+
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Streaming chat endpoint (Server-Sent Events)
+    
+    Request body: same as /api/chat
+    
+    Response (text/event-stream), one frame per answer token:
+        data: {"token": "The core"}
+    followed by a final frame:
+        data: {"done": true, "conversation_id": "uuid-string", "sources": [...], "model": "openai:gpt-4o-mini"}
+    or, if generation fails part-way:
+        data: {"error": "..."}
+    """
+    data = request.json or {}
+    question = data.get('question')
+    conversation_id = data.get('conversation_id')
+    user_id = data.get('user_id')
+    
+    if not question:
+        return jsonify({'error': 'Question is required'}), 400
+    
+    def generate():
+        # closing(): if the client disconnects, close the RAG generator right
+        # away so it stops pulling tokens from the LLM and saves what it has
+        try:
+            with closing(rag_answer_stream(
+                question=question,
+                conversation_id=conversation_id,
+                user_id=user_id,
+                save_to_db=True
+            )) as events:
+                for kind, payload in events:
+                    if kind == "token":
+                        yield _sse({'token': payload})
+                    else:
+                        yield _sse({
+                            'done': True,
+                            'conversation_id': payload['conversation_id'],
+                            'sources': _format_sources(payload['matches']),
+                            'model': payload['used_model_llm']
+                        })
+        except Exception:
+            err_id = uuid.uuid4().hex[:12]
+            log.exception('chat_stream_failed', extra={'err_id': err_id})
+            yield _sse({'error': 'Failed to generate an answer', 'err_id': err_id})
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+    return response
 
 
 @app.route('/api/conversations/<conversation_id>', methods=['GET'])
@@ -192,16 +380,15 @@ def get_conversation(conversation_id):
     }
     """
     try:
-        conn = get_pg_conn()
-        history = get_conversation_history(conn, conversation_id)
-        conn.close()
+        with pg_conn() as conn:
+            history = get_conversation_history(conn, conversation_id)
         
         # Format messages for frontend
         messages = [
             {
                 'role': msg['role'],
                 'content': msg['content'],
-                'created_at': msg['created_at'].isoformat() if msg['created_at'] else None
+                'created_at': msg['created_at']
             }
             for msg in history
         ]
@@ -211,49 +398,29 @@ def get_conversation(conversation_id):
             'messages': messages
         })
     
-    except Exception as e:
-        print(f"Error in /api/conversations: {e}")
-        return jsonify({'error': str(e)}), 500
+    except Exception:
+        return _internal_error('get_conversation_failed', 'Failed to fetch conversation')
 
 
 @app.route('/api/profile/<user_id>', methods=['GET'])
 def get_user_profile(user_id):
     """Retrieve the stored academic profile for a Supabase user."""
     try:
-        conn = get_pg_conn()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT user_id,
-                   school,
-                   academic_year,
-                   major,
-                   minors,
-                   classes_taken,
-                   profile_image,
-                   created_at,
-                   updated_at
-            FROM user_profiles
-            WHERE user_id = %s;
-        """, (user_id,))
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
+        with pg_conn() as conn, conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT {_PROFILE_COLUMNS}
+                FROM user_profiles
+                WHERE user_id = %s;
+            """, (user_id,))
+            row = cur.fetchone()
 
         if not row:
             return jsonify({'error': 'Profile not found'}), 404
 
-        serialized = _serialize_profile(row)
-        if not serialized:
-            return jsonify({'error': 'Failed to serialize profile'}), 500
-
-        return jsonify(serialized)
+        return _profile_response(_serialize_profile(row))
 
-    except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"Error fetching profile for user_id={user_id}: {e}")
-        print(f"Traceback: {error_trace}")
-        return jsonify({'error': str(e), 'traceback': error_trace}), 500
+    except Exception:
+        return _internal_error('get_profile_failed', 'Failed to fetch profile')
 
 
 @app.route('/api/profile', methods=['POST', 'PUT'])
@@ -273,32 +440,28 @@ def upsert_user_profile():
         classes_taken = _normalize_string_list(data.get('classes_taken'))
         profile_image = data.get('profile_image')
 
-        conn = get_pg_conn()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO user_profiles (user_id, school, academic_year, major, minors, classes_taken, profile_image)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (user_id)
-            DO UPDATE SET
-                school = EXCLUDED.school,
-                academic_year = EXCLUDED.academic_year,
-                major = EXCLUDED.major,
-                minors = EXCLUDED.minors,
-                classes_taken = EXCLUDED.classes_taken,
-                profile_image = EXCLUDED.profile_image,
-                updated_at = NOW()
-            RETURNING user_id, school, academic_year, major, minors, classes_taken, profile_image, created_at, updated_at;
-        """, (user_id, school, academic_year, major, minors, classes_taken, profile_image))
-        profile = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
-
-        return jsonify(_serialize_profile(profile))
-
-    except Exception as e:
-        print(f"Error saving profile for user_id={data.get('user_id')}: {e}")
-        return jsonify({'error': str(e)}), 500
+        with pg_conn() as conn, conn.cursor() as cur:
+            execute_prepared(cur, "ask_alma_upsert_profile", f"""
+                INSERT INTO user_profiles (user_id, school, academic_year, major, minors, classes_taken, profile_image)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (user_id)
+                DO UPDATE SET
+                    school = EXCLUDED.school,
+                    academic_year = EXCLUDED.academic_year,
+                    major = EXCLUDED.major,
+                    minors = EXCLUDED.minors,
+                    classes_taken = EXCLUDED.classes_taken,
+                    profile_image = EXCLUDED.profile_image,
+                    updated_at = NOW()
+                RETURNING {_PROFILE_COLUMNS};
+            """, (user_id, school, academic_year, major, minors, classes_taken, profile_image))
+            profile = cur.fetchone()
+            conn.commit()
+
+        return _profile_response(_serialize_profile(profile))
+
+    except Exception:
+        return _internal_error('save_profile_failed', 'Failed to save profile')
 
 
 @app.route('/api/conversations', methods=['GET'])
@@ -325,51 +488,34 @@ def list_conversations():
         user_id = request.args.get('user_id')  # Get user_id from query params
         print(f"Fetching conversations for user_id: {user_id}")
         
-        conn = get_pg_conn()
-        print(f"Database connection established: {conn is not None}")
-        cur = conn.cursor()
-        
-        # Filter by user_id if provided
-        if user_id:
-            cur.execute("""
-                SELECT 
-                    c.id,
-                    c.title,
-                    c.updated_at,
-                    COUNT(m.id) as message_count
-                FROM conversations c
-                LEFT JOIN messages m ON c.id = m.conversation_id
-                WHERE c.user_id = %s
-                GROUP BY c.id, c.title, c.updated_at
-                ORDER BY c.updated_at DESC
-                LIMIT 20;
-            """, (user_id,))
-        else:
-            # No user_id provided - return all conversations (for backwards compatibility)
-            cur.execute("""
-                SELECT 
-                    c.id,
-                    c.title,
-                    c.updated_at,
-                    COUNT(m.id) as message_count
-                FROM conversations c
-                LEFT JOIN messages m ON c.id = m.conversation_id
-                GROUP BY c.id, c.title, c.updated_at
-                ORDER BY c.updated_at DESC
-                LIMIT 20;
-            """)
-        
-        conversations = cur.fetchall()
+        with pg_conn() as conn, conn.cursor() as cur:
+            # Filter by user_id if provided
+            if user_id:
+                cur.execute("""
+                    SELECT id, title, updated_at, message_count
+                    FROM conversations
+                    WHERE user_id = %s
+                    ORDER BY updated_at DESC
+                    LIMIT 20;
+                """, (user_id,))
+            else:
+                # No user_id provided - return all conversations (for backwards compatibility)
+                cur.execute("""
+                    SELECT id, title, updated_at, message_count
+                    FROM conversations
+                    ORDER BY updated_at DESC
+                    LIMIT 20;
+                """)
+            
+            conversations = cur.fetchall()
         print(f"Found {len(conversations)} conversations")
-        cur.close()
-        conn.close()
         
         # Format for frontend
         result = [
             {
                 'id': str(conv['id']),
                 'title': conv['title'] or 'Untitled Conversation',
-                'updated_at': conv['updated_at'].isoformat() if conv['updated_at'] else None,
+                'updated_at': conv['updated_at'],
                 'message_count': conv['message_count']
             }
             for conv in conversations
@@ -377,11 +523,8 @@ def list_conversations():
         
         return jsonify({'conversations': result})
     
-    except Exception as e:
-        import traceback
-        print(f"Error in /api/conversations: {e}")
-        print(traceback.format_exc())
-        return jsonify({'error': f'Failed to fetch conversations: {str(e)}'}), 500
+    except Exception:
+        return _internal_error('list_conversations_failed', 'Failed to fetch conversations')
 
 
 @app.route('/api/conversations/search', methods=['GET'])
@@ -415,41 +558,37 @@ def search_conversations():
         if not search_query:
             return jsonify({'conversations': []}), 200
         
-        conn = get_pg_conn()
-        cur = conn.cursor()
-        
-        # Search in both conversation titles and message content
-        # Use ILIKE for case-insensitive search
+        # Search in both conversation titles and message content.
+        # ILIKE substring matches are served by the pg_trgm GIN indexes
+        # (src/migrations/add_search_trgm_indexes.sql); results whose titles
+        # are closest to the query come first.
         search_pattern = f'%{search_query}%'
         
-        cur.execute("""
-            SELECT DISTINCT
-                c.id,
-                c.title,
-                c.updated_at,
-                COUNT(m.id) as message_count
-            FROM conversations c
-            LEFT JOIN messages m ON c.id = m.conversation_id
-            WHERE c.user_id = %s
-                AND (
-                    c.title ILIKE %s
-                    OR m.content ILIKE %s
-                )
-            GROUP BY c.id, c.title, c.updated_at
-            ORDER BY c.updated_at DESC
-            LIMIT 50;
-        """, (user_id, search_pattern, search_pattern))
-        
-        conversations = cur.fetchall()
-        cur.close()
-        conn.close()
+        with pg_conn() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT c.id, c.title, c.updated_at, c.message_count
+                FROM conversations c
+                WHERE c.user_id = %s
+                    AND (
+                        c.title ILIKE %s
+                        OR EXISTS (
+                            SELECT 1 FROM messages m
+                            WHERE m.conversation_id = c.id
+                                AND m.content ILIKE %s
+                        )
+                    )
+                ORDER BY similarity(c.title, %s) DESC, c.updated_at DESC
+                LIMIT 50;
+            """, (user_id, search_pattern, search_pattern, search_query))
+            
+            conversations = cur.fetchall()
         
         # Format for frontend
         result = [
             {
                 'id': str(conv['id']),
                 'title': conv['title'] or 'Untitled Conversation',
-                'updated_at': conv['updated_at'].isoformat() if conv['updated_at'] else None,
+                'updated_at': conv['updated_at'],
                 'message_count': conv['message_count']
             }
             for conv in conversations
@@ -457,35 +596,28 @@ def search_conversations():
         
         return jsonify({'conversations': result})
     
-    except Exception as e:
-        import traceback
-        print(f"Error in /api/conversations/search: {e}")
-        print(traceback.format_exc())
-        return jsonify({'error': f'Failed to search conversations: {str(e)}'}), 500
+    except Exception:
+        return _internal_error('search_conversations_failed', 'Failed to search conversations')
 
 
 @app.route('/api/conversations/<conversation_id>', methods=['DELETE'])
 def delete_conversation(conversation_id):
     """Delete a conversation"""
     try:
-        conn = get_pg_conn()
-        cur = conn.cursor()
-        
-        cur.execute("DELETE FROM conversations WHERE id = %s;", (conversation_id,))
-        conn.commit()
-        
-        deleted = cur.rowcount > 0
-        cur.close()
-        conn.close()
+        with pg_conn() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM conversations WHERE id = %s;", (conversation_id,))
+            conn.commit()
+            
+            deleted = cur.rowcount > 0
         
         if deleted:
+            invalidate_conversation_history(conversation_id)
             return jsonify({'success': True, 'message': 'Conversation deleted'})
         else:
             return jsonify({'error': 'Conversation not found'}), 404
     
-    except Exception as e:
-        print(f"Error deleting conversation: {e}")
-        return jsonify({'error': str(e)}), 500
+    except Exception:
+        return _internal_error('delete_conversation_failed', 'Failed to delete conversation')
 
 
 @app.route('/api/conversations/<conversation_id>', methods=['PATCH'])
@@ -498,20 +630,16 @@ def update_conversation(conversation_id):
         if not title or not title.strip():
             return jsonify({'error': 'Title is required'}), 400
         
-        conn = get_pg_conn()
-        cur = conn.cursor()
-        
-        cur.execute("""
-            UPDATE conversations 
-            SET title = %s
-            WHERE id = %s
-            RETURNING id, title;
-        """, (title.strip(), conversation_id))
-        
-        updated = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
+        with pg_conn() as conn, conn.cursor() as cur:
+            cur.execute("""
+                UPDATE conversations 
+                SET title = %s
+                WHERE id = %s
+                RETURNING id, title;
+            """, (title.strip(), conversation_id))
+            
+            updated = cur.fetchone()
+            conn.commit()
         
         if updated:
             return jsonify({
@@ -524,39 +652,8 @@ def update_conversation(conversation_id):
         else:
             return jsonify({'error': 'Conversation not found'}), 404
     
-    except Exception as e:
-        print(f"Error updating conversation: {e}")
-        return jsonify({'error': str(e)}), 500
-
-
-# Serve React App (catch-all route must be last)
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    """Serve React frontend with optimized caching"""
-    if path and os.path.exists(os.path.join(app.static_folder, path)):
-        response = send_from_directory(app.static_folder, path)
-        
-        # Add cache headers for static assets
-        if path.endswith(('.js', '.css', '.png', '.jpg', '.jpeg', '.svg', '.ico', '.woff', '.woff2')):
-            # Cache static assets for 1 year (with versioning in filename)
-            response.cache_control.max_age = 31536000
-            response.cache_control.public = True
-            response.cache_control.immutable = True
-        elif path.endswith('.html'):
-            # Don't cache HTML files
-            response.cache_control.no_cache = True
-            response.cache_control.no_store = True
-            response.cache_control.must_revalidate = True
-        
-        return response
-    else:
-        # Don't cache index.html
-        response = send_from_directory(app.static_folder, 'index.html')
-        response.cache_control.no_cache = True
-        response.cache_control.no_store = True
-        response.cache_control.must_revalidate = True
-        return response
+    except Exception:
+        return _internal_error('update_conversation_failed', 'Failed to update conversation')
 
 
 if __name__ == '__main__':
@@ -575,6 +672,13 @@ if __name__ == '__main__':
     print("   POST   /api/profile")
     print("="*60 + "\n")
     
-    # Run the Flask server (port 5001 to avoid conflict with macOS AirPlay)
-    app.run(debug=True, host='0.0.0.0', port=5001)
+    # Run the Flask development server (port 5001 to avoid conflict with macOS
+    # AirPlay). Production runs under gunicorn (gunicorn.conf.py) instead.
+    # The debugger/reloader is opt-in: FLASK_DEBUG=1 python api/app.py
+    app.run(
+        debug=os.getenv('FLASK_DEBUG', '0') == '1',
+        host=os.getenv('HOST', '0.0.0.0'),
+        port=int(os.getenv('PORT', '5001')),
+        threaded=True,
+    )
 
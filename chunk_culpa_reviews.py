@@ -3,15 +3,20 @@
 Chunk the professor reviews from CULPA into 2000 character chunks
 """
 
-import json
+import orjson
 from tqdm import tqdm
 import re
 
+# Sentence boundary: . ! ? followed by whitespace and a capital letter
+_SENT_SPLIT = re.compile(r'(?<=[.!?])\s+(?=[A-Z])')
+# Split long sentences on commas/semicolons, keeping the delimiters
+_PART_SPLIT = re.compile(r'([,;])')
+
 
 def simple_sentence_split(text):
     """Simple regex-based sentence splitting"""
     # Split on sentence boundaries (. ! ? followed by whitespace and capital letter or end)
-    sentences = re.split(r'(?<=[.!?])\s+(?=[A-Z])', text)
+    sentences = _SENT_SPLIT.split(text)
     return [s.strip() for s in sentences if s.strip()]
 
 
@@ -34,7 +39,7 @@ def sentence_chunk_text(text, min_chars=2000, max_chars=3000, overlap_chars=200)
 
     for s in sentences:
         # Split long sentences further on commas/semicolons
-        parts = re.split(r'([,;])', s)
+        parts = _PART_SPLIT.split(s)
         for part in parts:
             part = part.strip()
             if not part:
@@ -96,43 +101,41 @@ def sentence_chunk_text(text, min_chars=2000, max_chars=3000, overlap_chars=200)
 def format_professor_text(professor):
     """Format professor information and reviews into text"""
     lines = []
+    append = lines.append
     
     # Professor header
-    lines.append(f"Professor: {professor['name']}")
-    if professor.get('department'):
-        lines.append(f"Department: {professor['department']}")
-    if professor.get('overall_rating'):
-        lines.append(f"Overall Rating: {professor['overall_rating']}/5.0")
+    append(f"Professor: {professor['name']}")
+    if department := professor.get('department'):
+        append(f"Department: {department}")
+    if overall_rating := professor.get('overall_rating'):
+        append(f"Overall Rating: {overall_rating}/5.0")
     
     # Courses taught
-    if professor.get('courses'):
-        lines.append(f"Courses: {', '.join(professor['courses'])}")
+    if courses := professor.get('courses'):
+        append(f"Courses: {', '.join(courses)}")
     
-    lines.append("")  # Blank line
+    append("")  # Blank line
     
-    # Reviews
-    if professor.get('reviews'):
-        lines.append(f"Student Reviews ({len(professor['reviews'])} total):")
-        lines.append("")
+    # Reviews (appended straight onto lines, one .get() per field)
+    if reviews := professor.get('reviews'):
+        append(f"Student Reviews ({len(reviews)} total):")
+        append("")
         
-        for idx, review in enumerate(professor['reviews'], 1):
-            review_lines = []
-            if review.get('course'):
-                review_lines.append(f"Review {idx} - {review['course']}")
-            else:
-                review_lines.append(f"Review {idx}")
+        for idx, review in enumerate(reviews, 1):
+            get = review.get
+            course = get('course')
+            append(f"Review {idx} - {course}" if course else f"Review {idx}")
             
-            if review.get('date'):
-                review_lines.append(f"Date: {review['date']}")
+            if date := get('date'):
+                append(f"Date: {date}")
             
-            if review.get('text'):
-                review_lines.append(f"{review['text']}")
+            if text := get('text'):
+                append(str(text))
             
-            if review.get('workload'):
-                review_lines.append(f"Workload: {review['workload']}")
+            if workload := get('workload'):
+                append(f"Workload: {workload}")
             
-            review_lines.append("")  # Blank line after each review
-            lines.extend(review_lines)
+            append("")  # Blank line after each review
     
     return "\n".join(lines)
 
@@ -149,8 +152,8 @@ def chunk_culpa_reviews(input_file, output_file, min_chars=2000, max_chars=3000)
     """
     print(f"Loading {input_file}...")
     
-    with open(input_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    with open(input_file, 'rb') as f:
+        data = orjson.loads(f.read())
     
     professors = data.get('professors', [])
     total_professors = len(professors)
@@ -189,9 +192,10 @@ def chunk_culpa_reviews(input_file, output_file, min_chars=2000, max_chars=3000)
     
     # Save to JSONL
     print(f"\nSaving chunks to {output_file}...")
-    with open(output_file, 'w', encoding='utf-8') as f:
+    with open(output_file, 'wb', buffering=1 << 20) as f:
         for record in chunked_data:
-            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.write(orjson.dumps(record))
+            f.write(b'\n')
     
     # Print statistics
     avg_chunk_size = sum(len(c['text']) for c in chunked_data) / len(chunked_data) if chunked_data else 0
@@ -3,29 +3,31 @@
 Chunk the scraped JSONL files (seas_2026.jsonl, barnard_2026.jsonl)
 """
 
+import os
 import sys
 from pathlib import Path
 
 # Add src/chunking to path
 sys.path.insert(0, str(Path(__file__).parent / "src" / "chunking"))
 
-from data_chunking import process_jsonl_files
-import json
+from data_chunking import iter_chunked_records, write_jsonl
 
-# Files to chunk
-filenames = [
-    "seas_2026.jsonl",
-    "barnard_2026.jsonl"
-]
 
-print(f"Chunking {len(filenames)} files...")
-chunked_data = process_jsonl_files(filenames, max_chars=300)
+def main():
+    # Files to chunk
+    filenames = [
+        "seas_2026.jsonl",
+        "barnard_2026.jsonl"
+    ]
 
-# Save the chunks to a new JSONL file for embeddings
-output_file = "chunked_scraped_2026.jsonl"
-with open(output_file, "w", encoding="utf-8") as f:
-    for record in chunked_data:
-        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    print(f"Chunking {len(filenames)} files...")
 
-print(f"✓ Saved {len(chunked_data)} chunks to {output_file}")
+    # Stream the chunks to a new JSONL file for embeddings
+    output_file = "chunked_scraped_2026.jsonl"
+    count = write_jsonl(iter_chunked_records(filenames, max_chars=300, workers=os.cpu_count()), output_file)
 
+    print(f"✓ Saved {count} chunks to {output_file}")
+
+
+if __name__ == "__main__":
+    main()
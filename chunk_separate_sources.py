@@ -3,40 +3,45 @@
 Chunk seas_2026.jsonl and barnard_2026.jsonl separately
 """
 
+import os
 import sys
 from pathlib import Path
 
+import orjson
+
 # Add src/chunking to path
 sys.path.insert(0, str(Path(__file__).parent / "src" / "chunking"))
 
-from data_chunking import process_jsonl_files
-import json
-
-# Process each file separately
-files_to_process = [
-    ("seas_2026.jsonl", "chunked_seas_2026.jsonl"),
-    ("barnard_2026.jsonl", "chunked_barnard_2026.jsonl")
-]
-
-all_chunked_data = []
-
-for input_file, output_file in files_to_process:
-    print(f"\nProcessing {input_file}...")
-    chunked_data = process_jsonl_files([input_file], max_chars=300)
-    
-    # Save individual file
-    with open(output_file, "w", encoding="utf-8") as f:
-        for record in chunked_data:
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
-    
-    print(f"✓ Saved {len(chunked_data)} chunks to {output_file}")
-    all_chunked_data.extend(chunked_data)
-
-# Also save combined file
-print(f"\nSaving combined file...")
-with open("chunked_bulletins.jsonl", "w", encoding="utf-8") as f:
-    for record in all_chunked_data:
-        f.write(json.dumps(record, ensure_ascii=False) + "\n")
-
-print(f"✓ Saved {len(all_chunked_data)} total unique chunks to chunked_bulletins.jsonl")
+from data_chunking import iter_chunked_records
+
+
+def main():
+    # Process each file separately
+    files_to_process = [
+        ("seas_2026.jsonl", "chunked_seas_2026.jsonl"),
+        ("barnard_2026.jsonl", "chunked_barnard_2026.jsonl")
+    ]
+
+    total_count = 0
+
+    # Each record goes to its per-source file and to the combined file as it is produced
+    with open("chunked_bulletins.jsonl", "wb", buffering=1 << 20) as combined:
+        for input_file, output_file in files_to_process:
+            print(f"\nProcessing {input_file}...")
+            count = 0
+        
+            with open(output_file, "wb", buffering=1 << 20) as f:
+                for record in iter_chunked_records([input_file], max_chars=300, workers=os.cpu_count()):
+                    line = orjson.dumps(record) + b"\n"
+                    f.write(line)
+                    combined.write(line)
+                    count += 1
+        
+            print(f"✓ Saved {count} chunks to {output_file}")
+            total_count += count
+
+    print(f"\n✓ Saved {total_count} total unique chunks to chunked_bulletins.jsonl")
+
 
+if __name__ == "__main__":
+    main()
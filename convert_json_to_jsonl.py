@@ -4,7 +4,7 @@ Convert scraped JSON files (seas_2026.json, barnard_2026.json) to JSONL format
 for chunking and embedding.
 """
 
-import json
+import orjson
 from tqdm import tqdm
 
 def convert_json_to_jsonl(json_file, jsonl_file, source_name):
@@ -18,13 +18,13 @@ def convert_json_to_jsonl(json_file, jsonl_file, source_name):
     """
     print(f"Converting {json_file} to {jsonl_file}...")
     
-    with open(json_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    with open(json_file, 'rb') as f:
+        data = orjson.loads(f.read())
     
     pages = data.get('pages', [])
     print(f"Found {len(pages)} pages")
     
-    with open(jsonl_file, 'w', encoding='utf-8') as f:
+    with open(jsonl_file, 'wb') as f:
         for i, page in enumerate(tqdm(pages, desc=f"Writing {jsonl_file}")):
             # Extract full_text from the page
             full_text = page.get('full_text', '').strip()
@@ -39,11 +39,11 @@ def convert_json_to_jsonl(json_file, jsonl_file, source_name):
                 "page_content": full_text,
                 "source": source_name
             }
-            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            f.write(orjson.dumps(entry) + b'\n')
     
     print(f"✓ Converted {len(pages)} pages to {jsonl_file}")
 
-if __name__ == "__main__":
+def main():
     # Convert SEAS 2026
     convert_json_to_jsonl(
         "seas_2026.json",
@@ -60,3 +60,5 @@ if __name__ == "__main__":
     
     print("\n✓ Conversion complete!")
 
+if __name__ == "__main__":
+    main()
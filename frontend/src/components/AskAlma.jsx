@@ -5,6 +5,7 @@ import { ArrowUp, Menu, X, MoreVertical, Search } from "lucide-react";
 import { useAuth } from "../context/AuthContext";
 import { categorizedQuestions } from "./askAlmaData";
 import ProfileModal from "./ProfileModal";
+import { streamChat } from "../lib/chatStream";
 
 // Get API URL based on environment
 const getApiUrl = () => {
@@ -187,7 +188,7 @@ function TypingText({ text, speed = 20, onComplete }) {
 }
 
 // Chat Message component
-function ChatMessage({ from, text, sources, timestamp, isTyping = false }) {
+function ChatMessage({ from, text, sources, timestamp, isTyping = false, streaming = false }) {
   const formatTime = (ts) => {
     if (!ts) return '';
     const date = new Date(ts);
@@ -217,6 +218,12 @@ function ChatMessage({ from, text, sources, timestamp, isTyping = false }) {
                   speed={8} 
                   onComplete={() => {}}
                 />
+              ) : streaming ? (
+                // Tokens are arriving live, so no typewriter animation
+                <>
+                  <MarkdownText text={text} />
+                  <span className="inline-block w-1 h-4 bg-gray-400 animate-pulse ml-0.5" />
+                </>
               ) : (
                 <MarkdownText text={text} />
               )}
@@ -274,6 +281,7 @@ export default function AskAlma() {
   const [conversations, setConversations] = useState([]);
   const [conversationsLoading, setConversationsLoading] = useState(true);
   const messagesEndRef = useRef(null);
+  const abortRef = useRef(null);  // AbortController of the answer being streamed
   const navigate = useNavigate();
   const { logout, user } = useAuth();
   const [searchParams] = useSearchParams();
@@ -397,6 +405,9 @@ export default function AskAlma() {
     return () => clearTimeout(timeoutId);
   }, [user, conversationSearchQuery]);
 
+  // Stop an in-flight answer when leaving the chat page
+  useEffect(() => () => abortRef.current?.abort(), []);
+
   // Load conversation from URL on mount
   useEffect(() => {
     if (urlConversationId && user?.id) {
@@ -479,25 +490,45 @@ export default function AskAlma() {
     setIsLoading(true);
     setError(null);
 
+    const controller = new AbortController();
+    abortRef.current = controller;
+    let answer = "";
+    let started = false;
+
+    // Replace the streamed (last) message with updated fields
+    const updateLast = (fields) => setMessages(prev => {
+      const next = prev.slice();
+      next[next.length - 1] = { ...next[next.length - 1], ...fields };
+      return next;
+    });
+
     try {
       // Use the backend API URL - backend runs on port 5001
       const apiUrl = getApiUrl();
-      const response = await fetch(`${apiUrl}/api/chat`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ 
-          question: queryText, 
-          conversation_id: conversationId,
-          user_id: user?.id  // Include user ID if logged in
-        }),
+      const data = await streamChat(apiUrl, {
+        question: queryText, 
+        conversation_id: conversationId,
+        user_id: user?.id  // Include user ID if logged in
+      }, {
+        signal: controller.signal,
+        // Show the answer as the LLM generates it
+        onToken: (token) => {
+          answer += token;
+          if (!started) {
+            started = true;
+            setLatestMessageIndex(-1);
+            setMessages(prev => [...prev, {
+              from: "alma",
+              text: answer,
+              streaming: true,
+              timestamp: new Date().toISOString()
+            }]);
+          } else {
+            updateLast({ text: answer });
+          }
+        },
       });
       
-      if (!response.ok) {
-        throw new Error(`API error: ${response.statusText}`);
-      }
-      
-      const data = await response.json();
-      
       // Update conversation ID if this is a new conversation
       if (!conversationId && data.conversation_id) {
         setConversationId(data.conversation_id);
@@ -507,23 +538,25 @@ export default function AskAlma() {
         fetchConversations();
       }
       
-      // Add AI response to UI with typing animation
-      const aiMessage = {
-        from: "alma",
-        text: data.answer || data.reply || "Sorry, I couldn't get a response.",
-        sources: data.sources,
-        timestamp: new Date().toISOString()
-      };
-      
-      setMessages(prev => {
-        const newMessages = [...prev, aiMessage];
-        setLatestMessageIndex(newMessages.length - 1);
-        return newMessages;
-      });
+      if (started) {
+        updateLast({ text: answer, streaming: false, sources: data.sources });
+      } else {
+        setMessages(prev => [...prev, {
+          from: "alma",
+          text: "Sorry, I couldn't get a response.",
+          timestamp: new Date().toISOString()
+        }]);
+      }
       
     } catch (err) {
+      // Aborted because the user switched or started a conversation
+      if (err.name === 'AbortError') return;
+
       console.error('Error sending message:', err);
       setError(err.message);
+      if (started) {
+        updateLast({ streaming: false });
+      }
       
       // Add error message to chat
       const errorMessage = {
@@ -537,7 +570,10 @@ export default function AskAlma() {
         return newMessages;
       });
     } finally {
-      setIsLoading(false);
+      if (abortRef.current === controller) {
+        abortRef.current = null;
+        setIsLoading(false);
+      }
     }
   };
 
@@ -574,7 +610,18 @@ export default function AskAlma() {
     }
   };
 
+  // Cancel the answer being streamed; the backend stops generating and keeps
+  // whatever was already produced
+  const stopStreaming = () => {
+    if (abortRef.current) {
+      abortRef.current.abort();
+      abortRef.current = null;
+      setIsLoading(false);
+    }
+  };
+
   const loadConversation = async (convId, shouldNavigate = true) => {
+    stopStreaming();
     try {
       const apiUrl = getApiUrl();
       const response = await fetch(`${apiUrl}/api/conversations/${convId}`);
@@ -618,6 +665,7 @@ export default function AskAlma() {
   };
 
   const startNewChat = () => {
+    stopStreaming();
     setMessages([]);
     setConversationId(null);
     setError(null);
@@ -1075,11 +1123,12 @@ export default function AskAlma() {
                     sources={msg.sources}
                     timestamp={msg.timestamp}
                     isTyping={msg.from === "alma" && i === latestMessageIndex}
+                    streaming={msg.streaming}
                   />
                 ))}
                 
-                {/* Loading indicator */}
-                {isLoading && (
+                {/* Loading indicator (until the first token arrives) */}
+                {isLoading && !messages[messages.length - 1]?.streaming && (
                   <div className="max-w-2xl w-fit flex items-start gap-3 self-start">
                     <div className="flex-shrink-0 mt-1 rounded-full" style={{ width: '35px', height: '35px', display: 'flex', alignItems: 'center', justifyContent: 'center', backgroundColor: '#B9D9EB' }}>
                       <img
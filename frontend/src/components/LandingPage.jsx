@@ -2,6 +2,7 @@ import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { ArrowUp } from 'lucide-react';
 import { categorizedQuestions } from './askAlmaData';
+import { streamChat } from '../lib/chatStream';
 
 // Get API URL based on environment
 const getApiUrl = () => {
@@ -165,6 +166,10 @@ export default function LandingPage() {
   const messagesEndRef = useRef(null);
   const [expandedCategories, setExpandedCategories] = useState({});
   const [hoveredQuestion, setHoveredQuestion] = useState(null);
+  const abortRef = useRef(null);
+
+  // Stop an in-flight answer if the user leaves the page
+  useEffect(() => () => abortRef.current?.abort(), []);
 
   // Set random greeting on mount
   useEffect(() => {
@@ -224,43 +229,63 @@ export default function LandingPage() {
     setSearchQuery('');
     setIsSending(true);
 
+    const controller = new AbortController();
+    abortRef.current = controller;
+    let reply = '';
+    let started = false;
+
+    // Replace the streamed (last) message with updated fields
+    const updateLast = (fields) => setMessages((prev) => {
+      const next = prev.slice();
+      next[next.length - 1] = { ...next[next.length - 1], ...fields };
+      return next;
+    });
+
     try {
       // Use the backend API URL - backend runs on port 5001
       const apiUrl = getApiUrl();
-      const res = await fetch(`${apiUrl}/api/chat`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ 
-          question: userMessage, 
-          conversation_id: conversationId 
-        }),
+      const data = await streamChat(apiUrl, {
+        question: userMessage,
+        conversation_id: conversationId
+      }, {
+        signal: controller.signal,
+        // Render tokens as they arrive instead of waiting for the full answer
+        onToken: (token) => {
+          reply += token;
+          if (!started) {
+            started = true;
+            setMessages((prev) => [...prev, { from: 'alma', text: reply, streaming: true, timestamp: new Date().toISOString() }]);
+          } else {
+            updateLast({ text: reply });
+          }
+        },
       });
       
-      if (!res.ok) {
-        throw new Error(`HTTP error! status: ${res.status}`);
-      }
-      
-      const data = await res.json();
-      const reply = data?.answer || "Sorry, I couldn't get a response.";
-      
       // Update conversation_id if returned
       if (data?.conversation_id) {
         setConversationId(data.conversation_id);
       }
       
-      setMessages((prev) => {
-        const newMessages = [...prev, { from: 'alma', text: reply, sources: data?.sources, timestamp: new Date().toISOString() }];
-        setTypingMessageIndex(newMessages.length - 1);
-        return newMessages;
-      });
+      if (started) {
+        updateLast({ text: reply, streaming: false, sources: data?.sources });
+      } else {
+        setMessages((prev) => [...prev, { from: 'alma', text: "Sorry, I couldn't get a response.", timestamp: new Date().toISOString() }]);
+      }
     } catch (e) {
+      if (e.name === 'AbortError') return;
       console.error('Error calling API:', e);
+      if (started) {
+        updateLast({ streaming: false });
+      }
       setMessages((prev) => {
         const newMessages = [...prev, { from: 'alma', text: "Network error. Please try again.", timestamp: new Date().toISOString() }];
         setTypingMessageIndex(newMessages.length - 1);
         return newMessages;
       });
     } finally {
+      if (abortRef.current === controller) {
+        abortRef.current = null;
+      }
       setIsSending(false);
     }
   };
@@ -452,6 +477,11 @@ export default function LandingPage() {
                                   <MarkdownText text={displayedText} />
                                   <span className="animate-pulse">|</span>
                                 </>
+                              ) : msg.streaming ? (
+                                <>
+                                  <MarkdownText text={msg.text} />
+                                  <span className="animate-pulse">|</span>
+                                </>
                               ) : (
                                 <MarkdownText text={msg.text} />
                               )}
@@ -485,7 +515,7 @@ export default function LandingPage() {
                     </div>
                   );
                 })}
-                {isSending && (
+                {isSending && !messages[messages.length - 1]?.streaming && (
                   <div className="flex items-start gap-3 w-full max-w-2xl">
                     <div className="flex-shrink-0 mt-1 rounded-full" style={{ width: '35px', height: '35px', display: 'flex', alignItems: 'center', justifyContent: 'center', backgroundColor: '#B9D9EB' }}>
                       <img
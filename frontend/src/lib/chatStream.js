@@ -0,0 +1,64 @@
+// Client for the backend's streaming chat endpoint (/api/chat/stream).
+//
+// The endpoint answers with Server-Sent Events: one {"token": "..."} frame per
+// piece of the answer, then a final {"done": true, conversation_id, sources,
+// model} frame, or an {"error": "...", "err_id": "..."} frame if it fails.
+
+// Call onEvent with each JSON payload in a text/event-stream response body
+async function readEventStream(response, onEvent) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Frames are separated by a blank line; keep any partial frame buffered
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const frame = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const data = frame
+        .split("\n")
+        .filter((line) => line.startsWith("data:"))
+        .map((line) => line.slice(5).trimStart())
+        .join("\n");
+      if (data) onEvent(JSON.parse(data));
+    }
+  }
+}
+
+// POST a question and stream the answer.
+// onToken(text) runs for every token; resolves with the final "done" payload.
+// Pass an AbortController's signal to stop generation (e.g. on navigation).
+export async function streamChat(apiUrl, body, { onToken, signal } = {}) {
+  const response = await fetch(`${apiUrl}/api/chat/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+    body: JSON.stringify(body),
+    signal,
+  });
+
+  if (!response.ok) {
+    throw new Error(`API error: ${response.statusText}`);
+  }
+
+  let result = null;
+  await readEventStream(response, (event) => {
+    if (event.error) {
+      throw new Error(event.error);
+    }
+    if (event.done) {
+      result = event;
+    } else if (event.token && onToken) {
+      onToken(event.token);
+    }
+  });
+
+  if (!result) {
+    throw new Error("Chat stream ended before the answer was complete");
+  }
+  return result;
+}
@@ -0,0 +1,32 @@
+"""
+Gunicorn configuration for the AskAlma API.
+
+Usage (from project root):
+    gunicorn -c gunicorn.conf.py api.app:app
+
+The workload is I/O bound (OpenAI + Postgres round trips), so each worker runs
+a pool of threads; a slow /api/chat call only occupies one thread instead of
+blocking the whole process. Keep PG_POOL_MAX (src/embedder/rag_query.py) at
+least as large as `threads`, since each worker process owns its own pool.
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '5001')}")
+
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# RAG answers can take several seconds end to end
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers periodically to contain slow memory growth
+max_requests = 1000
+max_requests_jitter = 100
+
+accesslog = "-"
+errorlog = "-"
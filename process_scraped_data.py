@@ -9,31 +9,38 @@ Complete pipeline to process scraped JSON files:
 
 import os
 import sys
-import subprocess
 from pathlib import Path
 
 # Add src directories to path
 sys.path.insert(0, str(Path(__file__).parent / "src" / "chunking"))
 sys.path.insert(0, str(Path(__file__).parent / "src" / "embedder"))
 
-def run_step(step_name, command, description):
-    """Run a step in the pipeline."""
+def run_step(step_name, func, description):
+    """Run a step of the pipeline in this process."""
     print(f"\n{'='*80}")
     print(f"Step: {step_name}")
     print(f"Description: {description}")
     print(f"{'='*80}\n")
     
-    result = subprocess.run(command, shell=True, cwd=Path(__file__).parent)
-    if result.returncode != 0:
-        print(f"\n❌ Error in {step_name}")
+    try:
+        func()
+    except Exception as e:
+        print(f"\n❌ Error in {step_name}: {e}")
         sys.exit(1)
     print(f"\n✓ {step_name} completed successfully")
 
 def main():
+    # Inputs and outputs are relative to the repo root
+    os.chdir(Path(__file__).parent)
+    
+    # Steps run in this process, so shared imports (numpy, tqdm, dotenv) load once
+    from convert_json_to_jsonl import main as convert_main
+    import upload_embeddings
+    
     # Step 1: Convert JSON to JSONL
     run_step(
         "Convert JSON to JSONL",
-        "python3 convert_json_to_jsonl.py",
+        convert_main,
         "Converting seas_2026.json and barnard_2026.json to JSONL format"
     )
     
@@ -44,20 +51,15 @@ def main():
     print("="*80 + "\n")
     
     # Import and run chunking
-    from data_chunking import process_jsonl_files, sentence_chunk_text
-    import json
-    from tqdm import tqdm
+    from data_chunking import iter_chunked_records, write_jsonl
     
     filenames = ["seas_2026.jsonl", "barnard_2026.jsonl"]
-    chunked_data = process_jsonl_files(filenames, max_chars=300)
     
-    # Save chunked data
+    # Stream chunks straight to the JSONL file
     chunked_file = "chunked_scraped_2026.jsonl"
-    with open(chunked_file, "w", encoding="utf-8") as f:
-        for record in chunked_data:
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    count = write_jsonl(iter_chunked_records(filenames, max_chars=300), chunked_file)
     
-    print(f"✓ Saved {len(chunked_data)} chunks to {chunked_file}")
+    print(f"✓ Saved {count} chunks to {chunked_file}")
     
     # Step 3: Generate embeddings
     print("\n" + "="*80)
@@ -76,19 +78,21 @@ def main():
     
     # Generate embeddings
     print(f"\nEmbedding {len(chunks)} chunks...")
-    result = embed_corpus(chunks, models=["text-embedding-3-small"], batch_size=64)
+    result = embed_corpus(chunks, models=["openai:text-embedding-3-small"], batch_size=64)
     
     for name, payload in result.items():
         print(f"{name}: {payload['embeddings'].shape}, dim: {payload['dim']}")
     
-    # Save embeddings
-    save_numpy_bundle(result, out_dir="./emb_out")
+    # Save embeddings (so upload_embeddings.py can redo the upload on its own)
+    save_numpy_bundle(result, metadata, out_dir="./emb_out")
     print("✓ Embeddings saved")
     
-    # Step 4: Upload to Supabase
+    # Step 4: Upload to Supabase straight from memory, without re-reading the bundle
+    payload = result["openai:text-embedding-3-small"]
+    sources = [m["source"] for m in metadata]
     run_step(
         "Upload to Supabase",
-        "cd src/embedder && python3 upload_embeddings.py",
+        lambda: upload_embeddings.upload(payload["embeddings"], payload["ids"], payload["texts"], sources),
         "Uploading embeddings to Supabase database"
     )
     
@@ -4,10 +4,14 @@ Script to redo all chunking, delete existing embeddings, and re-embed everything
 """
 
 import os
+import subprocess
 import sys
 from dotenv import load_dotenv
 import psycopg2
 
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+EMBEDDER_DIR = os.path.join(ROOT_DIR, "src", "embedder")
+
 # Load environment variables
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -35,11 +39,11 @@ try:
     count = cur.fetchone()[0]
     print(f"   Found {count} existing embeddings")
     
-    # Delete all rows
-    cur.execute("DELETE FROM documents;")
-    deleted = cur.rowcount
+    # Delete all rows (TRUNCATE drops the table's files instead of
+    # deleting and WAL-logging every row, and leaves no dead tuples to vacuum)
+    cur.execute("TRUNCATE documents;")
     conn.commit()
-    print(f"   ✓ Deleted {deleted} embeddings")
+    print(f"   ✓ Deleted {count} embeddings")
     
     cur.close()
     conn.close()
@@ -47,19 +51,27 @@ except Exception as e:
     print(f"   ✗ Error deleting embeddings: {e}")
     sys.exit(1)
 
+
+def run_step(script, cwd):
+    """Run a pipeline script with this interpreter; stop if it fails."""
+    result = subprocess.run([sys.executable, script], cwd=cwd)
+    if result.returncode != 0:
+        sys.exit(f"   ✗ {script} exited with status {result.returncode}")
+
+
 # Step 2: Run chunking
 print("\n2️⃣  Running chunking process...")
 print("   (This will create chunks with minimum 2000 characters)")
-os.system("cd /Users/crystallow/ask_alma && venv/bin/python3 src/chunking/data_chunking.py")
+run_step(os.path.join("src", "chunking", "data_chunking.py"), ROOT_DIR)
 
 # Step 3: Run embedding
 print("\n3️⃣  Generating embeddings...")
 print("   (This may take a while)")
-os.system("cd /Users/crystallow/ask_alma/src/embedder && ../../venv/bin/python3 embedder.py")
+run_step("embedder.py", EMBEDDER_DIR)
 
 # Step 4: Upload embeddings
 print("\n4️⃣  Uploading embeddings to Supabase...")
-os.system("cd /Users/crystallow/ask_alma/src/embedder && ../../venv/bin/python3 upload_embeddings.py")
+run_step("upload_embeddings.py", EMBEDDER_DIR)
 
 print("\n" + "=" * 60)
 print("✅ ALL DONE!")
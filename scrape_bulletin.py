@@ -5,12 +5,32 @@ Visits all links and extracts all text content from every page
 """
 
 import requests
-from bs4 import BeautifulSoup
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from selectolax.lexbor import LexborHTMLParser
+import orjson
+import os
 import time
 from urllib.parse import urljoin, urlparse
 from collections import deque
-import re
+from concurrent.futures import ThreadPoolExecutor
+
+# One session for the whole crawl so the TCP/TLS connection to the bulletin
+# host is reused instead of re-handshaken for every page. Throttling comes
+# from the server: 429/503 responses are retried after their Retry-After.
+SESSION = requests.Session()
+SESSION.headers.update({
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+})
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=5, backoff_factor=1, status_forcelist=(429, 503), respect_retry_after_header=True),
+))
+
+# Pages fetched at once: the crawl is bound by request latency, so a small
+# frontier of parallel requests (sharing SESSION's pool) cuts wall time
+MAX_CONCURRENT = 8
 
 def scrape_page(url, visited_urls):
     """
@@ -27,43 +47,40 @@ def scrape_page(url, visited_urls):
         return None
     
     try:
-        # Add headers to mimic a browser request
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
         print(f"Scraping: {url}")
-        response = requests.get(url, headers=headers, timeout=15)
+        response = SESSION.get(url, timeout=15)
         response.raise_for_status()
         
-        soup = BeautifulSoup(response.content, 'html.parser')
+        # lexbor (C) parser; script/style bodies are dropped so they don't end up in the text
+        tree = LexborHTMLParser(response.content)
+        tree.strip_tags(['script', 'style'])
         
         # Extract title
-        title = soup.find('h1')
-        title_text = title.get_text(strip=True) if title else "No title found"
+        title = tree.css_first('h1')
+        title_text = title.text(strip=True) if title else "No title found"
         
         # Extract main content
-        main_content = soup.find('main') or soup.find('div', class_='content') or soup.find('article')
+        main_content = tree.css_first('main') or tree.css_first('div.content') or tree.css_first('article')
         if not main_content:
-            main_content = soup.find('body')
+            main_content = tree.body
         
         # Extract ALL text content from the page
         full_text = ""
         if main_content:
             # Get all text directly - this captures everything
-            full_text = main_content.get_text(separator=' ', strip=True)
+            full_text = main_content.text(separator=' ', strip=True)
             # Clean up excessive whitespace
-            full_text = re.sub(r'\s+', ' ', full_text).strip()
+            full_text = ' '.join(full_text.split())
         
         # Extract all links on the page
         links = []
         base_domain = urlparse(url).netloc
         base_path = urlparse(url).path.rsplit('/', 1)[0] if '/' in urlparse(url).path else ''
         
-        for link in soup.find_all('a', href=True):
-            href = link['href']
+        for link in tree.css('a[href]'):
+            href = link.attributes.get('href') or ''
             full_url = urljoin(url, href)
-            link_text = link.get_text(strip=True)
+            link_text = link.text(strip=True)
             
             # Only include links that are within the same domain and catalog/bulletin section
             parsed_link = urlparse(full_url)
@@ -110,34 +127,76 @@ def scrape_bulletin_recursive(start_url, output_file='seas_2026.json', max_pages
     visited_urls = set()
     pages_data = []
     url_queue = deque([start_url])
+    queued = {start_url}  # same URLs as url_queue, for O(1) membership checks
     pages_scraped = 0
     
-    while url_queue and pages_scraped < max_pages:
-        current_url = url_queue.popleft()
-        
-        if current_url in visited_urls:
-            continue
-        
-        # Scrape the current page
-        page_data = scrape_page(current_url, visited_urls)
-        
-        if page_data:
-            pages_data.append(page_data)
-            pages_scraped += 1
-            
-            # Add new links to the queue
-            for link in page_data['links']:
+    # Pages are also appended to a JSONL journal as they are scraped, so an
+    # interrupted run loses at most the page in flight. Pick those up first.
+    journal_file = output_file.replace('.json', '.pages.jsonl')
+    if os.path.exists(journal_file):
+        recovered = []
+        with open(journal_file, 'r+b') as f:
+            offset = good_end = 0  # byte offset just past the last complete record
+            terminated = True
+            for line in f:
+                offset += len(line)
+                try:
+                    page = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue  # last line cut off mid-write
+                good_end = offset
+                terminated = line.endswith(b'\n')
+                if page['url'] not in visited_urls:
+                    visited_urls.add(page['url'])
+                    recovered.append(page)
+            # Drop a cut-off last line, or the next append would be glued onto it
+            f.truncate(good_end)
+            if not terminated:
+                # The write stopped just before its newline
+                f.seek(good_end)
+                f.write(b'\n')
+        pages_data.extend(recovered)
+        pages_scraped = len(pages_data)
+        for page in recovered:
+            for link in page.get('links', []):
                 link_url = link['url']
-                # Only add if we haven't visited it and it's not already in queue
-                if link_url not in visited_urls and link_url not in url_queue:
+                if link_url not in visited_urls and link_url not in queued:
                     url_queue.append(link_url)
+                    queued.add(link_url)
+        print(f"Recovered {len(recovered)} pages from interrupted run ({journal_file})\n")
+    
+    with open(journal_file, 'ab') as journal, ThreadPoolExecutor(max_workers=MAX_CONCURRENT) as pool:
+        while url_queue and pages_scraped < max_pages:
+            # Take the next frontier of unvisited URLs and fetch them concurrently
+            frontier = []
+            while url_queue and len(frontier) < min(MAX_CONCURRENT, max_pages - pages_scraped):
+                current_url = url_queue.popleft()
+                queued.discard(current_url)
+                if current_url not in visited_urls and current_url not in frontier:
+                    frontier.append(current_url)
             
-            print(f"  ✓ Scraped page {pages_scraped}: {page_data['title']}")
-            print(f"    Found {len(page_data['links'])} links, {len(page_data['full_text'])} characters of text")
-            print(f"    Queue size: {len(url_queue)}\n")
-            
-            # Small delay to be respectful to the server
-            time.sleep(0.5)
+            # Results come back in frontier order, so pages keep BFS order
+            for page_data in pool.map(lambda u: scrape_page(u, visited_urls), frontier):
+                if not page_data:
+                    continue
+                
+                pages_data.append(page_data)
+                pages_scraped += 1
+                journal.write(orjson.dumps(page_data) + b'\n')
+                journal.flush()
+                os.fsync(journal.fileno())
+                
+                # Add new links to the queue
+                for link in page_data['links']:
+                    link_url = link['url']
+                    # Only add if we haven't visited it and it's not already in queue
+                    if link_url not in visited_urls and link_url not in queued:
+                        url_queue.append(link_url)
+                        queued.add(link_url)
+                
+                print(f"  ✓ Scraped page {pages_scraped}: {page_data['title']}")
+                print(f"    Found {len(page_data['links'])} links, {len(page_data['full_text'])} characters of text")
+                print(f"    Queue size: {len(url_queue)}\n")
     
     # Save all scraped data to JSON
     output_data = {
@@ -147,8 +206,11 @@ def scrape_bulletin_recursive(start_url, output_file='seas_2026.json', max_pages
         'pages': pages_data
     }
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(output_data, f, indent=2, ensure_ascii=False)
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(output_data, option=orjson.OPT_INDENT_2))
+    
+    # Everything in the journal is in the JSON file now
+    os.remove(journal_file)
     
     print(f"\n{'='*80}")
     print(f"Scraping complete!")
@@ -158,20 +220,21 @@ def scrape_bulletin_recursive(start_url, output_file='seas_2026.json', max_pages
     
     # Also create a summary text file
     txt_file = output_file.replace('.json', '_summary.txt')
+    rule = '=' * 80
+    parts = [
+        f"Columbia Engineering Bulletin Scrape Summary\n",
+        f"{rule}\n\n",
+        f"Start URL: {start_url}\n",
+        f"Total Pages: {len(pages_data)}\n",
+        f"Scraped At: {output_data['scraped_at']}\n\n",
+        f"{rule}\n\n",
+    ]
+    for i, page in enumerate(pages_data, 1):
+        parts.append(f"\n{rule}\nPAGE {i}: {page['title']}\nURL: {page['url']}\n{rule}\n\n{page['full_text']}\n\n")
+    
+    # Build the whole summary first and write it in one call
     with open(txt_file, 'w', encoding='utf-8') as f:
-        f.write(f"Columbia Engineering Bulletin Scrape Summary\n")
-        f.write(f"{'='*80}\n\n")
-        f.write(f"Start URL: {start_url}\n")
-        f.write(f"Total Pages: {len(pages_data)}\n")
-        f.write(f"Scraped At: {output_data['scraped_at']}\n\n")
-        f.write(f"{'='*80}\n\n")
-        
-        for i, page in enumerate(pages_data, 1):
-            f.write(f"\n{'='*80}\n")
-            f.write(f"PAGE {i}: {page['title']}\n")
-            f.write(f"URL: {page['url']}\n")
-            f.write(f"{'='*80}\n\n")
-            f.write(f"{page['full_text']}\n\n")
+        f.write("".join(parts))
     
     print(f"Summary text file saved to: {txt_file}")
 
@@ -1,11 +1,62 @@
-import nltk
-import json
+import orjson
+import re
 from tqdm import tqdm
-import hashlib
+import xxhash
+import os
+from functools import partial
+from multiprocessing import Pool
+
+# The bulletins are plain English prose, so sentences are split with a regex
+# (end punctuation, whitespace, capital letter). Set CHUNK_USE_NLTK=1 to use
+# NLTK's Punkt tokenizer instead, e.g. for text with many abbreviations.
+USE_NLTK = os.getenv("CHUNK_USE_NLTK", "0") == "1"
+
+_SENTENCE_TOKENIZER = None
+
+# Sentence boundary: end punctuation, whitespace, then a capital letter. The
+# boundaries are matched rather than split on with a (?<=[.!?]) lookbehind,
+# which made the regex engine test the lookbehind at every position.
+_SENT_END = re.compile(r'[.!?]\s+(?=[A-Z])')
+
+# Split long sentences on commas/semicolons, keeping the delimiters
+_PART_SPLIT = re.compile(r'([,;])')
+
+
+def _get_sentence_tokenizer():
+    """
+    Load the English Punkt model once and reuse it for every page, instead of
+    resolving it through nltk.data on each sent_tokenize() call.
+    Only used when USE_NLTK is set; nltk is imported here so it isn't needed otherwise.
+    """
+    global _SENTENCE_TOKENIZER
+    if _SENTENCE_TOKENIZER is None:
+        import nltk
+        try:
+            # NLTK >= 3.8.2 ships Punkt parameters as punkt_tab
+            from nltk.tokenize.punkt import PunktTokenizer
+            resource, load = "punkt_tab", lambda: PunktTokenizer("english")
+        except ImportError:
+            resource, load = "punkt", lambda: nltk.data.load("tokenizers/punkt/english.pickle")
+        try:
+            _SENTENCE_TOKENIZER = load()
+        except LookupError:
+            # Download the sentence tokenizer only if it isn't installed yet
+            nltk.download(resource, quiet=True)
+            _SENTENCE_TOKENIZER = load()
+    return _SENTENCE_TOKENIZER
+
+
+def _split_sentences(text):
+    """Split page text into sentences (regex by default, Punkt with USE_NLTK)."""
+    if USE_NLTK:
+        return _get_sentence_tokenizer().tokenize(text)
+    sentences, pos = [], 0
+    for m in _SENT_END.finditer(text):
+        sentences.append(text[pos:m.start() + 1])
+        pos = m.end()
+    sentences.append(text[pos:])
+    return sentences
 
-# Download NLTK sentence tokenizer if not already present
-nltk.download('punkt', quiet=True)
-from nltk.tokenize import sent_tokenize
 
 def sentence_chunk_text(text, min_chars=2000, max_chars=3000, overlap_chars=200):
     """
@@ -19,37 +70,52 @@ def sentence_chunk_text(text, min_chars=2000, max_chars=3000, overlap_chars=200)
         max_chars: Maximum characters per chunk (default 3000)
         overlap_chars: Number of characters to overlap between consecutive chunks (default 200)
     """
-    import re
-    # use nltk to split sentences semantically
-    sentences = sent_tokenize(text)
-    chunks, current = [], ""
+    # split into sentences first so chunks break at sentence boundaries
+    sentences = _split_sentences(text)
+    chunks = []
+    # The chunk being built is kept as a list of pieces plus the length of
+    # " ".join(pieces), so appending a part doesn't copy the whole chunk
+    # string; it is only joined when we need to look at its text.
+    pieces, current_len = [], 0
     overlap_buffer = []  # Store sentences/parts for overlap
 
     for s in sentences:
         # Split long sentences further on commas/semicolons
-        parts = re.split(r'([,;])', s)
+        parts = _PART_SPLIT.split(s)
         for part in parts:
             part = part.strip()
             if not part:
                 continue
                 
-            # If a single part is longer than max_chars, split it
-            while len(part) > max_chars:
-                # Hard split if part is too long
-                chunks.append(part[:max_chars])
-                # Update overlap buffer with the end of this chunk
-                overlap_text = part[max_chars-overlap_chars:max_chars] if max_chars > overlap_chars else part[:max_chars]
+            # If a single part is longer than max_chars, hard split it at
+            # max_chars boundaries. Walk an index instead of re-slicing the
+            # remainder each round, which copied the rest of the part every time.
+            if len(part) > max_chars:
+                start, end = 0, len(part)
+                while end - start > max_chars:
+                    last = start
+                    chunks.append(part[start:start + max_chars])
+                    start += max_chars
+                    # Skip whitespace the next piece would otherwise start with
+                    while start < end and part[start].isspace():
+                        start += 1
+                # Update overlap buffer with the end of the last hard-split chunk
+                overlap_text = part[last + max_chars - overlap_chars:last + max_chars] if max_chars > overlap_chars else part[last:last + max_chars]
                 overlap_buffer = [overlap_text] if overlap_text.strip() else []
-                part = part[max_chars:].strip()
+                part = part[start:]
             
-            # Append to current chunk if it fits
-            test_current = current + (" " + part if current else part)
+            # Length of the current chunk if this part were appended
+            test_len = current_len + 1 + len(part) if pieces else len(part)
             
             # If adding this part would exceed max_chars, save current chunk
-            if len(test_current) > max_chars:
+            # (current_len is an upper bound on the stripped length, so the
+            # chunk is only joined and stripped once it could be flushed)
+            if test_len > max_chars and current_len >= min_chars:
+                current = " ".join(pieces)
+                stripped = current.strip()
                 # Only save if current chunk meets minimum size
-                if current and len(current.strip()) >= min_chars:
-                    chunks.append(current.strip())
+                if current and len(stripped) >= min_chars:
+                    chunks.append(stripped)
                     # Build overlap buffer from the end of current chunk
                     if len(current) >= overlap_chars:
                         overlap_text = current[-overlap_chars:].strip()
@@ -59,105 +125,186 @@ def sentence_chunk_text(text, min_chars=2000, max_chars=3000, overlap_chars=200)
                             overlap_text = overlap_text[first_space+1:]
                         overlap_buffer = [overlap_text] if overlap_text else []
                     else:
-                        overlap_buffer = [current.strip()] if current.strip() else []
+                        overlap_buffer = [stripped] if stripped else []
                     
                     # Start new chunk with overlap from previous chunk
                     if overlap_buffer:
                         overlap_str = " ".join(overlap_buffer)
-                        current = overlap_str + " " + part if overlap_str else part
+                        pieces = [overlap_str, part] if overlap_str else [part]
                     else:
-                        current = part
+                        pieces = [part]
+                    current_len = len(pieces[0]) + 1 + len(part) if len(pieces) == 2 else len(part)
                 else:
                     # Current chunk is too small, keep adding to it
-                    current = test_current
+                    pieces.append(part)
+                    current_len = test_len
             else:
-                current = test_current
+                pieces.append(part)
+                current_len = test_len
 
     # Save final chunk if it meets minimum size
-    if current and len(current.strip()) >= min_chars:
-        chunks.append(current.strip())
+    current = " ".join(pieces)
+    stripped = current.strip()
+    if current and len(stripped) >= min_chars:
+        chunks.append(stripped)
     elif current:
         # If final chunk is too small, append it to the last chunk if possible
         if chunks:
-            chunks[-1] = chunks[-1] + " " + current.strip()
+            chunks[-1] = chunks[-1] + " " + stripped
         else:
             # If it's the only chunk and too small, include it anyway
-            chunks.append(current.strip())
+            chunks.append(stripped)
     
     return chunks
 
 
-def process_jsonl_files(filenames, min_chars=2000, max_chars=3000, overlap_chars=200):
+def _chunk_page(entry, min_chars, max_chars, overlap_chars):
+    """Chunk one page's page_content (module-level so worker processes can run it)."""
+    chunks = sentence_chunk_text(entry["page_content"], min_chars=min_chars, max_chars=max_chars, overlap_chars=overlap_chars)
+    return entry["source"], entry["page_index"], chunks
+
+
+def _iter_new_pages(lines, seen_pages):
+    """
+    Parse JSONL lines, skipping pages whose page_content was already seen.
+    An identical page would only produce chunks that get deduplicated anyway,
+    so repeated pages (shared boilerplate, re-scraped URLs) aren't chunked at all.
+    """
+    for line in lines:
+        entry = orjson.loads(line)
+        page_hash = xxhash.xxh3_64_intdigest(entry["page_content"].encode('utf-8'))
+        if page_hash in seen_pages:
+            continue
+        seen_pages.add(page_hash)
+        yield entry
+
+
+def _count_lines(filename):
+    """Count lines for the progress bar by scanning raw bytes (no decoding)."""
+    with open(filename, "rb") as f:
+        return sum(block.count(b"\n") for block in iter(partial(f.read, 1 << 20), b""))
+
+
+def iter_chunked_records(filenames, min_chars=2000, max_chars=3000, overlap_chars=200, workers=1):
     """
     Read JSONL files and split page_content into sentence-based chunks with overlap.
-    Returns a list of dictionaries containing source, page_index, chunk_id, and text.
-    Deduplicates chunks to avoid processing repeated content.
+    Yields dictionaries containing source, page_index, chunk_id, and text, one
+    at a time, so callers can write them out without holding the whole corpus.
+    Skips pages whose content was already seen and deduplicates chunks.
     
     Args:
         filenames: List of JSONL file paths
         min_chars: Minimum characters per chunk (default 2000)
         max_chars: Maximum characters per chunk (default 3000)
         overlap_chars: Number of characters to overlap between consecutive chunks (default 200)
+        workers: Number of processes to chunk pages with (default 1 = in-process).
+            Pages come back in file order, so deduplication and output are the
+            same for any worker count. Scripts passing workers > 1 must keep
+            their top-level code under `if __name__ == "__main__":`.
     """
-    data = []
-    seen_chunks = set()  # Track unique chunks by hash
+    seen_chunks = set()  # Track unique chunks by (length, 64-bit hash) packed into an int
+    seen_pages = set()  # Same for whole pages, checked before chunking
     duplicate_count = 0
 
-    for filename in tqdm(filenames, desc="Processing files"):
-        with open(filename, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-
-        for line in tqdm(lines, desc=f"Chunking {filename}", leave=False):
-            entry = json.loads(line)
-            text = entry["page_content"]
-            source = entry["source"]
-            page_index = entry["page_index"]
-
-            for i, chunk in enumerate(sentence_chunk_text(text, min_chars=min_chars, max_chars=max_chars, overlap_chars=overlap_chars)):
-                # Normalize chunk for comparison (strip whitespace, lowercase)
-                normalized_chunk = chunk.strip().lower()
+    chunk_page = partial(_chunk_page, min_chars=min_chars, max_chars=max_chars, overlap_chars=overlap_chars)
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        for filename in tqdm(filenames, desc="Processing files"):
+            # Binary mode: orjson parses the raw UTF-8 lines without a decode step
+            with open(filename, "rb") as f:
+                # Iterate the file instead of readlines() so pages are read as
+                # they are chunked rather than all held in memory up front
+                lines = tqdm(f, total=_count_lines(filename), desc=f"Chunking {filename}", leave=False)
+                entries = _iter_new_pages(lines, seen_pages)
+                pages = pool.imap(chunk_page, entries, chunksize=16) if pool else map(chunk_page, entries)
+                for source, page_index, chunks in pages:
+                    for i, chunk in enumerate(chunks):
+                        # Normalize chunk for comparison: chunks come out of
+                        # sentence_chunk_text already stripped, so just encode and
+                        # lowercase the bytes (ASCII case folding in one C pass)
+                        data = chunk.encode('utf-8').lower()
                 
-                # Create a hash of the normalized chunk
-                chunk_hash = hashlib.md5(normalized_chunk.encode('utf-8')).hexdigest()
+                        # 64-bit xxh3 of the normalized chunk with its byte length packed
+                        # above it: still one int per set entry, but chunks of different
+                        # lengths can never collide
+                        chunk_hash = (len(data) << 64) | xxhash.xxh3_64_intdigest(data)
                 
-                # Only add if we haven't seen this chunk before
-                if chunk_hash not in seen_chunks:
-                    seen_chunks.add(chunk_hash)
-                    data.append({
-                        "source": source,
-                        "page_index": page_index,
-                        "chunk_id": i,
-                        "text": chunk
-                    })
-                else:
-                    duplicate_count += 1
+                        # Only add if we haven't seen this chunk before
+                        if chunk_hash not in seen_chunks:
+                            seen_chunks.add(chunk_hash)
+                            yield {
+                                "source": source,
+                                "page_index": page_index,
+                                "chunk_id": i,
+                                "text": chunk
+                            }
+                        else:
+                            duplicate_count += 1
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
 
     if duplicate_count > 0:
         print(f"\nSkipped {duplicate_count} duplicate chunks")
-    
-    return data
-
-
-# All files to process (2024-2025 and 2026)
-filenames = [
-    "barnard_2024_2025.jsonl",
-    "columbia_engineering_2024_2025.jsonl",
-    "columbia_college_2024_2025.jsonl",
-    "seas_2026.jsonl",
-    "barnard_2026.jsonl",
-    "columbia_college_2026.jsonl"
-]
-
-# Process files into chunks with at least 2000 characters, max 3000, with 200 character overlap
-print("Starting chunking process...")
-print(f"Chunk size: minimum {2000} chars, maximum {3000} chars, overlap {200} chars")
-chunked_data = process_jsonl_files(filenames, min_chars=2000, max_chars=3000, overlap_chars=200)
-
-# Save the chunks to a new JSONL file for embeddings
-output_file = "chunked_all_bulletins.jsonl"
-with open(output_file, "w", encoding="utf-8") as f:
-    for record in chunked_data:
-        f.write(json.dumps(record, ensure_ascii=False) + "\n")
-
-print(f"\n✓ Saved {len(chunked_data)} chunks to {output_file}")
-print(f"  Average chunk size: {sum(len(c['text']) for c in chunked_data) / len(chunked_data):.0f} characters")
+
+
+def process_jsonl_files(filenames, min_chars=2000, max_chars=3000, overlap_chars=200, workers=1):
+    """
+    Same as iter_chunked_records, collected into a list.
+    Prefer iter_chunked_records + write_jsonl when the chunks only go to a file.
+    """
+    return list(iter_chunked_records(filenames, min_chars=min_chars, max_chars=max_chars,
+                                     overlap_chars=overlap_chars, workers=workers))
+
+
+def write_jsonl(records, output_file):
+    """
+    Write records to a JSONL file, one orjson-encoded object per line (UTF-8, non-ASCII kept as-is).
+    Accepts any iterable, so a generator is streamed straight to disk. Returns the number of records written.
+    """
+    count = 0
+    # 1 MiB buffer: records are small, so writes reach the OS in large blocks
+    with open(output_file, "wb", buffering=1 << 20) as f:
+        for record in records:
+            f.write(orjson.dumps(record))
+            f.write(b"\n")
+            count += 1
+    return count
+
+
+def _main():
+    # All files to process (2024-2025 and 2026)
+    filenames = [
+        "barnard_2024_2025.jsonl",
+        "columbia_engineering_2024_2025.jsonl",
+        "columbia_college_2024_2025.jsonl",
+        "seas_2026.jsonl",
+        "barnard_2026.jsonl",
+        "columbia_college_2026.jsonl"
+    ]
+
+    # Process files into chunks with at least 2000 characters, max 3000, with 200 character overlap
+    print("Starting chunking process...")
+    print(f"Chunk size: minimum {2000} chars, maximum {3000} chars, overlap {200} chars")
+    records = iter_chunked_records(filenames, min_chars=2000, max_chars=3000, overlap_chars=200,
+                                   workers=os.cpu_count())
+
+    # Stream the chunks to a new JSONL file for embeddings
+    output_file = "chunked_all_bulletins.jsonl"
+    total_chars = 0
+
+    def _count_chars(records):
+        nonlocal total_chars
+        for record in records:
+            total_chars += len(record["text"])
+            yield record
+
+    count = write_jsonl(_count_chars(records), output_file)
+
+    print(f"\n✓ Saved {count} chunks to {output_file}")
+    print(f"  Average chunk size: {total_chars / count:.0f} characters")
+
+
+if __name__ == "__main__":
+    _main()
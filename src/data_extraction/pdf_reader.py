@@ -1,20 +1,22 @@
 from pypdf import PdfReader
-import json
+import orjson
 import glob
+from concurrent.futures import ProcessPoolExecutor
 
 
 def extract_text_from_pdfs(pdf_file, json_file):
-    reader = PdfReader(str(pdf_file))
-    with open(json_file, "w", encoding="utf-8") as file:
+    source = str(pdf_file)
+    reader = PdfReader(source)
+    with open(json_file, "wb") as file:
         for page_index, page in enumerate(reader.pages, start=1):
             page_content = page.extract_text() or ""
+            # Pages with no text are skipped rather than writing a line for them
             if page_content:
-                formatted_json = {
+                file.write(orjson.dumps({
                     "page_index": page_index,
                     "page_content": page_content,
-                    "source": pdf_file
-                    }
-            file.write(json.dumps(formatted_json, ensure_ascii=False) + "\n")
+                    "source": source
+                    }) + b"\n")
 
 
 if __name__ == "__main__":
@@ -23,8 +25,9 @@ if __name__ == "__main__":
         "columbia_college_2024_2025.jsonl", 
         "columbia_engineering_2024_2025.jsonl"]
     pdf_files = glob.glob("pdfs/*.pdf")
-    for filename, json_file_output in zip(pdf_files, jsonl_paths):
-        extract_text_from_pdfs(filename, json_file_output)
+    # pypdf is pure Python, so each PDF gets its own process
+    with ProcessPoolExecutor() as executor:
+        list(executor.map(extract_text_from_pdfs, pdf_files, jsonl_paths))
        
             
         
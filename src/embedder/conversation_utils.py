@@ -3,68 +3,78 @@
 Utility functions for managing conversations in the AskAlma RAG system.
 """
 
-from rag_query import get_pg_conn
+from rag_query import pg_conn
 from typing import List, Dict, Any
 import sys
 
 
+# All helpers borrow connections from rag_query's pool, so a process that
+# calls several of them pays the TCP/TLS handshake once.
 def list_all_conversations(limit: int = 20) -> List[Dict[str, Any]]:
     """List all conversations with their titles and message counts."""
-    conn = get_pg_conn()
-    cur = conn.cursor()
-    
-    cur.execute("""
-        SELECT 
-            c.id,
-            c.title,
-            c.created_at,
-            c.updated_at,
-            COUNT(m.id) as message_count,
-            MAX(m.created_at) as last_message_at
-        FROM conversations c
-        LEFT JOIN messages m ON c.id = m.conversation_id
-        GROUP BY c.id, c.title, c.created_at, c.updated_at
-        ORDER BY c.updated_at DESC
-        LIMIT %s;
-    """, (limit,))
-    
-    conversations = cur.fetchall()
-    cur.close()
-    conn.close()
-    
-    return conversations
+    with pg_conn() as conn, conn.cursor() as cur:
+        # message_count is trigger-maintained; the latest message is one probe of
+        # idx_messages_conversation_created per listed conversation
+        cur.execute("""
+            SELECT 
+                c.id,
+                c.title,
+                c.created_at,
+                c.updated_at,
+                c.message_count,
+                (
+                    SELECT m.created_at
+                    FROM messages m
+                    WHERE m.conversation_id = c.id
+                    ORDER BY m.created_at DESC
+                    LIMIT 1
+                ) as last_message_at
+            FROM conversations c
+            ORDER BY c.updated_at DESC
+            LIMIT %s;
+        """, (limit,))
+        
+        return cur.fetchall()
 
 
 def get_conversation_details(conversation_id: str) -> Dict[str, Any]:
     """Get detailed information about a specific conversation."""
-    conn = get_pg_conn()
-    cur = conn.cursor()
-    
-    # Get conversation metadata
-    cur.execute("""
-        SELECT id, title, created_at, updated_at
-        FROM conversations
-        WHERE id = %s;
-    """, (conversation_id,))
-    
-    conversation = cur.fetchone()
+    with pg_conn() as conn, conn.cursor() as cur:
+        # Conversation metadata and its messages in one round trip: the LEFT
+        # JOIN repeats the conversation columns on every message row (and
+        # yields one row with NULL message columns if it has no messages)
+        cur.execute("""
+            SELECT
+                c.id, c.title, c.created_at AS conversation_created_at, c.updated_at,
+                m.role, m.content, m.created_at, m.metadata
+            FROM conversations c
+            LEFT JOIN messages m ON m.conversation_id = c.id
+            WHERE c.id = %s
+            ORDER BY m.created_at ASC;
+        """, (conversation_id,))
+        
+        rows = cur.fetchall()
     
-    if not conversation:
-        cur.close()
-        conn.close()
+    if not rows:
         return None
     
-    # Get all messages
-    cur.execute("""
-        SELECT role, content, created_at, metadata
-        FROM messages
-        WHERE conversation_id = %s
-        ORDER BY created_at ASC;
-    """, (conversation_id,))
-    
-    messages = cur.fetchall()
-    cur.close()
-    conn.close()
+    first = rows[0]
+    conversation = {
+        "id": first["id"],
+        "title": first["title"],
+        "created_at": first["conversation_created_at"],
+        "updated_at": first["updated_at"],
+    }
+    messages = [
+        {
+            "role": row["role"],
+            "content": row["content"],
+            "created_at": row["created_at"],
+            "metadata": row["metadata"],
+        }
+        for row in rows
+        if row["role"] is not None
+    ]
     
     return {
         "conversation": conversation,
@@ -74,20 +84,13 @@ def get_conversation_details(conversation_id: str) -> Dict[str, Any]:
 
 def delete_conversation(conversation_id: str) -> bool:
     """Delete a conversation and all its messages."""
-    conn = get_pg_conn()
-    cur = conn.cursor()
-    
     try:
-        cur.execute("DELETE FROM conversations WHERE id = %s;", (conversation_id,))
-        conn.commit()
-        deleted = cur.rowcount > 0
-        cur.close()
-        conn.close()
-        return deleted
+        with pg_conn() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM conversations WHERE id = %s;", (conversation_id,))
+            conn.commit()
+            return cur.rowcount > 0
     except Exception as e:
-        conn.rollback()
-        cur.close()
-        conn.close()
+        # pg_conn() has already rolled back
         print(f"Error deleting conversation: {e}")
         return False
 
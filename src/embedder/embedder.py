@@ -1,12 +1,27 @@
 from __future__ import annotations
 from typing import Dict, List, Callable, Any
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 import hashlib
+import os
+import time
 import numpy as np
 from tqdm import tqdm
 
 # --- Choose your backends here ---
-# LangChain embedding classes
-from langchain_community.embeddings import OllamaEmbeddings, HuggingFaceEmbeddings
+# LangChain embedding classes. langchain_community is slow to import and only
+# needed for the Hugging Face entry, so it is imported on use.
+def _community_embeddings(name: str):
+    from langchain_community import embeddings
+    return getattr(embeddings, name)
+
+# langchain_ollama's class sends a whole batch as one /api/embed request; the
+# langchain_community one posts each text to /api/embeddings separately.
+def _ollama_embeddings():
+    from langchain_ollama import OllamaEmbeddings
+    return OllamaEmbeddings
+
 # If you want OpenAI (optional):
 try:
     from langchain_openai import OpenAIEmbeddings     # requires OPENAI_API_KEY
@@ -18,12 +33,12 @@ except Exception:
 # Each entry defines how to build the LangChain Embeddings object and optional kwargs.
 # Enable/disable entries by commenting them in/out inside ENABLED_MODELS.
 MODEL_BUILDERS: Dict[str, Callable[[], Any]] = {
-    "ollama:nomic-embed-text": lambda: OllamaEmbeddings(
+    "ollama:nomic-embed-text": lambda: _ollama_embeddings()(
         model="nomic-embed-text", base_url="http://localhost:11434"
     ),
 
     # Hugging Face local (CPU/GPU). Good default: all-MiniLM-L6-v2 (384-dim)
-    "hf:all-MiniLM-L6-v2": lambda: HuggingFaceEmbeddings(
+    "hf:all-MiniLM-L6-v2": lambda: _community_embeddings("HuggingFaceEmbeddings")(
         model_name="sentence-transformers/all-MiniLM-L6-v2",
         encode_kwargs={"normalize_embeddings": True}
     ),
@@ -34,6 +49,15 @@ MODEL_BUILDERS: Dict[str, Callable[[], Any]] = {
     ),
 }
 
+# Embedding API calls kept in flight at once. The calls are network-bound, so
+# overlapping several hides most of the round trip; rate-limit errors are
+# retried with backoff per call. Lower it if your API tier keeps hitting 429s.
+EMBED_IN_FLIGHT = int(os.getenv("EMBED_IN_FLIGHT", "8"))
+
+# Flush the checkpoint to disk every this many batches (and whenever a run
+# fails). A crash re-embeds at most this many batches on resume.
+EMBED_CHECKPOINT_EVERY = int(os.getenv("EMBED_CHECKPOINT_EVERY", "10"))
+
 ENABLED_MODELS: List[str] = [
     # "ollama:nomic-embed-text",
     # "hf:all-MiniLM-L6-v2",
@@ -47,6 +71,24 @@ def _hash_text(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()[:16]
 
 
+def _is_rate_limit(e: Exception) -> bool:
+    return "rate_limit" in str(e).lower() or "429" in str(e) or "RateLimitError" in str(type(e).__name__)
+
+
+# one embedding API call, retried with exponential backoff on rate limits
+def _embed_with_retry(embedder, batch: List[str], max_retries: int = 5, retry_delay: int = 2) -> List[List[float]]:
+    for attempt in range(max_retries):
+        try:
+            return embedder.embed_documents(batch)
+        except Exception as e:
+            if _is_rate_limit(e) and attempt < max_retries - 1:
+                wait_time = retry_delay * (2 ** attempt)  # Exponential backoff
+                tqdm.write(f"Rate limit hit, waiting {wait_time}s before retry {attempt + 1}/{max_retries}...")
+                time.sleep(wait_time)
+            else:
+                raise
+
+
 # embedding chunks in batches of 64
 def _batch(iterable, n=64):
     chunk = []
@@ -60,28 +102,51 @@ def _batch(iterable, n=64):
 
 
 # ---------- 3) CHECKPOINT HELPERS ----------
-def save_checkpoint(model_name: str, vectors: List[List[float]], processed_count: int, out_dir: str = "./emb_out"):
-    """Save checkpoint after each batch to allow resuming."""
-    import os
+# The checkpoint is a .npy file sized for the whole run and memory-mapped, so
+# each batch only writes its own rows instead of re-saving every vector so far.
+def create_checkpoint(model_name: str, shape: tuple[int, int], out_dir: str = "./emb_out") -> np.ndarray:
+    """Allocate an (N x D) float32 checkpoint on disk and return it memory-mapped."""
     os.makedirs(out_dir, exist_ok=True)
     safe = model_name.replace(":", "_").replace("/", "_")
     checkpoint_path = os.path.join(out_dir, f"{safe}.checkpoint.npy")
-    np.save(checkpoint_path, np.array(vectors, dtype="float32"))
-    # Save progress info
     progress_path = os.path.join(out_dir, f"{safe}.progress.txt")
-    with open(progress_path, "w") as f:
+    # A progress count left by an earlier run would describe rows of this
+    # new, zero-filled array that were never embedded
+    if os.path.exists(progress_path):
+        os.remove(progress_path)
+    vectors = np.lib.format.open_memmap(checkpoint_path, mode="w+", dtype="float32", shape=shape)
+    # Record progress 0 right away: saves only happen every EMBED_CHECKPOINT_EVERY
+    # batches, and until then progress.txt must still describe this array
+    save_checkpoint(model_name, vectors, 0, out_dir)
+    return vectors
+
+
+def save_checkpoint(model_name: str, vectors: np.ndarray, processed_count: int, out_dir: str = "./emb_out"):
+    """
+    Flush the rows written so far and record how many are done. The rows are
+    synced before the progress count is replaced, so after a crash the count
+    never covers rows that didn't reach the disk.
+    """
+    vectors.flush()
+    # Save progress info (write-then-rename so it's never half written)
+    safe = model_name.replace(":", "_").replace("/", "_")
+    progress_path = os.path.join(out_dir, f"{safe}.progress.txt")
+    tmp_path = progress_path + ".tmp"
+    with open(tmp_path, "w") as f:
         f.write(f"{processed_count}\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, progress_path)
 
 
 def load_checkpoint(model_name: str, out_dir: str = "./emb_out") -> tuple[np.ndarray, int]:
-    """Load checkpoint if it exists, return (embeddings_array, processed_count)."""
-    import os
+    """Reopen the checkpoint if it exists, return (memmapped embeddings, processed_count)."""
     safe = model_name.replace(":", "_").replace("/", "_")
     checkpoint_path = os.path.join(out_dir, f"{safe}.checkpoint.npy")
     progress_path = os.path.join(out_dir, f"{safe}.progress.txt")
     
     if os.path.exists(checkpoint_path) and os.path.exists(progress_path):
-        embeddings = np.load(checkpoint_path)
+        embeddings = np.lib.format.open_memmap(checkpoint_path, mode="r+")
         with open(progress_path, "r") as f:
             processed_count = int(f.read().strip())
         return embeddings, processed_count
@@ -100,6 +165,25 @@ def clear_checkpoint(model_name: str, out_dir: str = "./emb_out"):
         os.remove(progress_path)
 
 
+def load_embedding_cache(model_name: str, out_dir: str = "./emb_out") -> Dict[str, np.ndarray]:
+    """Load {id: vector} for every text this model has embedded in earlier runs."""
+    safe = model_name.replace(":", "_").replace("/", "_")
+    cache_path = os.path.join(out_dir, f"{safe}.cache.npz")
+    if not os.path.exists(cache_path):
+        return {}
+    with np.load(cache_path) as data:
+        return dict(zip(data["ids"].tolist(), data["embeddings"]))
+
+
+def save_embedding_cache(model_name: str, cache: Dict[str, np.ndarray], out_dir: str = "./emb_out"):
+    """Persist the id -> vector cache so re-runs only embed new or changed chunks."""
+    os.makedirs(out_dir, exist_ok=True)
+    safe = model_name.replace(":", "_").replace("/", "_")
+    cache_path = os.path.join(out_dir, f"{safe}.cache.npz")
+    np.savez(cache_path, ids=np.array(list(cache.keys())),
+             embeddings=np.array(list(cache.values()), dtype="float32"))
+
+
 # ---------- 3) CORE FUNCTION ----------
 def embed_corpus(
     chunks: List[str],
@@ -130,64 +214,94 @@ def embed_corpus(
             raise ValueError(f"Unknown model '{model_name}'. Add it to MODEL_BUILDERS.")
 
         embedder = MODEL_BUILDERS[model_name]()
+
+        # Only texts whose id isn't cached from an earlier run (or repeated
+        # earlier in this corpus) go to the API. The checkpoint below tracks
+        # progress through this list.
+        cache = load_embedding_cache(model_name, checkpoint_dir)
+        to_embed, to_embed_ids = [], []
+        queued = set(cache)
+        for t, _id in zip(chunks, ids):
+            if _id not in queued:
+                queued.add(_id)
+                to_embed.append(t)
+                to_embed_ids.append(_id)
+        if len(to_embed) < len(chunks):
+            tqdm.write(f"{len(chunks) - len(to_embed)}/{len(chunks)} chunks already embedded (cached or repeated), skipping them")
         
-        # Try to load checkpoint
-        checkpoint_embeddings, processed_count = load_checkpoint(model_name, checkpoint_dir)
-        if checkpoint_embeddings is not None:
-            vectors = checkpoint_embeddings.tolist()
-            tqdm.write(f"Resuming from checkpoint: {processed_count}/{len(chunks)} chunks already processed")
-        else:
-            vectors = []
-            processed_count = 0
+        # Try to load checkpoint (rows line up with to_embed, so a checkpoint
+        # of a different size is from another corpus and is started over)
+        vectors, processed_count = load_checkpoint(model_name, checkpoint_dir)
+        if vectors is not None and len(vectors) != len(to_embed):
+            vectors, processed_count = None, 0
+            clear_checkpoint(model_name, checkpoint_dir)
+        if vectors is not None:
+            tqdm.write(f"Resuming from checkpoint: {processed_count}/{len(to_embed)} chunks already processed")
 
         # Try batched embedding (LangChain embeds) with graceful fallback
         try:
             # Some backends support list input natively; we still batch to control memory.
-            batches = list(_batch(chunks, batch_size))
-            import time
+            # Batches are built lazily as they are submitted.
+            # Resume from the exact row rather than a batch boundary: the
+            # checkpoint may come from a run with a different batch_size, and
+            # rows are written at processed_count below.
+            batch_iter = _batch(islice(to_embed, processed_count, None), batch_size)
             
-            # Skip batches that were already processed
-            start_batch = processed_count // batch_size
-            batches_to_process = batches[start_batch:]
+            if processed_count > 0:
+                tqdm.write(f"Skipping {processed_count} already-processed chunks")
             
-            if start_batch > 0:
-                tqdm.write(f"Skipping {start_batch} already-processed batches")
-            
-            for batch_idx, batch in enumerate(tqdm(batches_to_process, desc=f"Embedding [{model_name}]", unit="batch", 
-                            initial=start_batch, total=len(batches),
-                            bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]')):
-                # Retry logic for rate limits
-                max_retries = 5
-                retry_delay = 2
-                for attempt in range(max_retries):
-                    try:
-                        batch_vectors = embedder.embed_documents(batch)
-                        vectors.extend(batch_vectors)
-                        processed_count += len(batch)
-                        
-                        # Save checkpoint after each successful batch
-                        save_checkpoint(model_name, vectors, processed_count, checkpoint_dir)
-                        break
-                    except Exception as e:
-                        if "rate_limit" in str(e).lower() or "429" in str(e) or "RateLimitError" in str(type(e).__name__):
-                            if attempt < max_retries - 1:
-                                wait_time = retry_delay * (2 ** attempt)  # Exponential backoff
-                                tqdm.write(f"Rate limit hit, waiting {wait_time}s before retry {attempt + 1}/{max_retries}...")
-                                time.sleep(wait_time)
-                            else:
+            # Keep up to EMBED_IN_FLIGHT API calls running while finished
+            # batches are written into the checkpoint in order on this thread.
+            with ThreadPoolExecutor(max_workers=EMBED_IN_FLIGHT) as pool:
+                pending = deque()
+                for batch in islice(batch_iter, EMBED_IN_FLIGHT):
+                    pending.append((batch, pool.submit(_embed_with_retry, embedder, batch)))
+
+                batches_done = 0
+                with tqdm(desc=f"Embedding [{model_name}]", unit="chunk",
+                          initial=processed_count, total=len(to_embed),
+                          bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]') as pbar:
+                    while pending:
+                        batch, future = pending.popleft()
+                        try:
+                            batch_vectors = future.result()
+                        except Exception as e:
+                            for _, other in pending:
+                                other.cancel()
+                            if vectors is not None:
                                 # Save checkpoint before raising error
                                 save_checkpoint(model_name, vectors, processed_count, checkpoint_dir)
-                                tqdm.write(f"Saved checkpoint at {processed_count}/{len(chunks)} chunks. Resume by running again.")
-                                raise
-                        else:
+                                tqdm.write(f"Saved checkpoint at {processed_count}/{len(to_embed)} chunks. Resume by running again.")
                             raise
+
+                        next_batch = next(batch_iter, None)
+                        if next_batch is not None:
+                            pending.append((next_batch, pool.submit(_embed_with_retry, embedder, next_batch)))
+
+                        if vectors is None:
+                            # First batch tells us the dimension
+                            vectors = create_checkpoint(model_name, (len(to_embed), len(batch_vectors[0])), checkpoint_dir)
+                        vectors[processed_count:processed_count + len(batch)] = batch_vectors
+                        processed_count += len(batch)
+                        
+                        pbar.update(len(batch))
+                        batches_done += 1
+                        # Save checkpoint every EMBED_CHECKPOINT_EVERY batches
+                        if batches_done % EMBED_CHECKPOINT_EVERY == 0:
+                            save_checkpoint(model_name, vectors, processed_count, checkpoint_dir)
         except TypeError:
             # Fallback to per-item embedding if the backend doesn't support list calls
-            for t in tqdm(chunks, desc=f"Embedding [{model_name}]", unit="chunk",
-                         bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]'):
-                vectors.append(embedder.embed_query(t))
+            vectors = [embedder.embed_query(t) for t in tqdm(
+                to_embed, desc=f"Embedding [{model_name}]", unit="chunk",
+                bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]')]
 
-        arr = np.array(vectors, dtype="float32")
+        if to_embed:
+            # Copy out of the memmap: the checkpoint file is deleted below
+            cache.update(zip(to_embed_ids, np.array(vectors, dtype="float32")))
+            save_embedding_cache(model_name, cache, checkpoint_dir)
+        vectors = None
+
+        arr = np.array([cache[_id] for _id in ids], dtype="float32")
         results[model_name] = {
             "embeddings": arr,
             "dim": arr.shape[1] if arr.ndim == 2 else len(arr[0]),
@@ -202,11 +316,19 @@ def embed_corpus(
 
 
 # ---------- 4) OPTIONAL PERSIST HELPERS ----------
-def save_numpy_bundle(result: Dict[str, Dict[str, Any]], metadata: List[Dict[str, Any]] = None, out_dir: str = "./emb_out"):
+# Newlines/tabs inside a chunk would break the one-row-per-line TSV layout
+_TSV_FIELD = str.maketrans({"\n": " ", "\r": " ", "\t": " "})
+
+
+def save_numpy_bundle(result: Dict[str, Dict[str, Any]], metadata: List[Dict[str, Any]] = None, out_dir: str = "./emb_out",
+                      dtype: str = "float32"):
     """
     Saves:
-      - {model}.npy: embeddings
+      - {model}.npy: embeddings, stored as `dtype`
       - {model}.meta.tsv: id<TAB>text<TAB>source
+
+    dtype="float16" halves the .npy size; cosine similarities move by well under 1e-4.
+    upload_embeddings reads either, since pgvector stores float4 regardless.
     """
     import os
     os.makedirs(out_dir, exist_ok=True)
@@ -216,12 +338,15 @@ def save_numpy_bundle(result: Dict[str, Dict[str, Any]], metadata: List[Dict[str
         npy_path = os.path.join(out_dir, f"{safe}.npy")
         meta_path = os.path.join(out_dir, f"{safe}.meta.tsv")
 
-        np.save(npy_path, payload["embeddings"])
+        np.save(npy_path, payload["embeddings"].astype(dtype, copy=False))
+        # Get source from metadata if available
+        sources = [m.get("source", "unknown") for m in (metadata or [])[:len(payload["ids"])]]
+        sources += ["unknown"] * (len(payload["ids"]) - len(sources))
         with open(meta_path, "w", encoding="utf-8") as f:
-            for i, (_id, txt) in enumerate(zip(payload["ids"], payload["texts"])):
-                # Get source from metadata if available
-                source = metadata[i].get("source", "unknown") if metadata and i < len(metadata) else "unknown"
-                f.write(f"{_id}\t{txt.replace('\n',' ')}\t{source}\n")
+            f.write("".join(
+                f"{_id}\t{txt.translate(_TSV_FIELD)}\t{source}\n"
+                for _id, txt, source in zip(payload["ids"], payload["texts"], sources)
+            ))
 
         print(f"Saved: {npy_path} ({payload['embeddings'].shape})")
         print(f"Saved: {meta_path}")
@@ -236,17 +361,18 @@ def load_chunks_from_jsonl(file_paths: List[str]) -> tuple[List[str], List[Dict[
         chunks: List of page_content strings
         metadata: List of metadata dicts (page_index, source)
     """
-    import json
+    import orjson
     
     chunks = []
     metadata = []
     
     for file_path in file_paths:
         print(f"Loading chunks from {file_path}...")
-        with open(file_path, "r", encoding="utf-8") as f:
+        # 1 MiB buffer: fewer read() calls than the 8 KiB default on large chunk files
+        with open(file_path, "rb", buffering=1 << 20) as f:
             for line in f:
                 if line.strip():  # Skip empty lines
-                    data = json.loads(line)
+                    data = orjson.loads(line)
                     # Support both 'page_content' and 'text' fields
                     text = data.get("page_content") or data.get("text", "")
                     chunks.append(text)
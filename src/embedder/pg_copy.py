@@ -0,0 +1,82 @@
+"""
+Binary COPY helpers for bulk-loading embeddings into the documents table.
+
+Rows are streamed with COPY ... FROM STDIN (FORMAT BINARY) into a temp
+staging table and then upserted in a single INSERT ... SELECT. Vectors go
+over the wire in pgvector's binary format (float4 per element) instead of
+8-decimal text literals, so nothing is formatted or parsed per float.
+"""
+
+import io
+import struct
+from typing import Iterable, Tuple
+
+import numpy as np
+
+STAGING_TABLE = "_documents_upload"
+
+# PGCOPY signature, flags field, header extension length
+_COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+_COPY_TRAILER = struct.pack("!h", -1)
+_INT32 = struct.Struct("!i")
+_VECTOR_HEADER = struct.Struct("!ihh")  # byte length, dim, unused
+
+
+def _text_field(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return _INT32.pack(len(data)) + data
+
+
+def _vector_field(vec: np.ndarray) -> bytes:
+    """pgvector binary send format: int16 dim, int16 unused, float4[dim] big-endian."""
+    dim = vec.shape[0]
+    return _VECTOR_HEADER.pack(4 + 4 * dim, dim, 0) + vec.astype(">f4", copy=False).tobytes()
+
+
+def encode_copy_rows(rows: Iterable[Tuple[str, str, str, str, np.ndarray]]) -> io.BytesIO:
+    """Encode (id, content, source, model, embedding) rows as a binary COPY stream."""
+    buf = io.BytesIO()
+    buf.write(_COPY_HEADER)
+    field_count = struct.pack("!h", 5)
+    for _id, content, source, model, vec in rows:
+        buf.write(field_count)
+        buf.write(_text_field(_id))
+        buf.write(_text_field(content))
+        buf.write(_text_field(source))
+        buf.write(_text_field(model))
+        buf.write(_vector_field(vec))
+    buf.write(_COPY_TRAILER)
+    buf.seek(0)
+    return buf
+
+
+def create_staging_table(cur, table_name: str) -> None:
+    """Temp table with the same columns as `table_name`, dropped on commit."""
+    cur.execute(f"""
+        create temp table if not exists {STAGING_TABLE}
+          (like {table_name} including defaults) on commit drop;
+    """)
+
+
+def copy_rows(cur, rows: Iterable[Tuple[str, str, str, str, np.ndarray]]) -> None:
+    """Stream one batch of rows into the staging table."""
+    cur.copy_expert(
+        f"copy {STAGING_TABLE} (id, content, source, model, embedding) "
+        "from stdin with (format binary)",
+        encode_copy_rows(rows),
+    )
+
+
+def upsert_from_staging(cur, table_name: str) -> int:
+    """Move staged rows into `table_name`, replacing rows with the same id."""
+    cur.execute(f"""
+        insert into {table_name} (id, content, source, model, embedding)
+        select id, content, source, model, embedding from {STAGING_TABLE}
+        on conflict (id) do update set
+          content = excluded.content,
+          source  = excluded.source,
+          model   = excluded.model,
+          embedding = excluded.embedding,
+          created_at = now();
+    """)
+    return cur.rowcount
@@ -3,11 +3,29 @@ import os
 import textwrap
 import json
 import re
-from typing import Optional, List, Dict, Any
+import hashlib
+import atexit
+from array import array
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Optional, List, Dict, Any, Iterator, Tuple
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extensions import connection as PGConnection
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from dotenv import load_dotenv
+from datetime import datetime
 import uuid
+import orjson
+
+try:
+    import redis  # optional: conversation history cache
+except ImportError:
+    redis = None
 
 # Load environment variables (OPENAI_API_KEY, DATABASE_URL)
 # Load from .env in the same directory as this file
@@ -17,9 +35,9 @@ if os.path.exists(local_env):
 else:
     load_dotenv()  # Fall back to default location 
 
-# Embeddings + LLM
+# Embeddings + LLM (langchain_ollama is imported in get_llm() only when
+# LLM_PROVIDER is "ollama", so the API doesn't load it at startup otherwise)
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_ollama import ChatOllama
 
 # -------------------------------
 # Config
@@ -47,11 +65,44 @@ OLLAMA_MODELS = {
 # Choose your model
 OPENAI_MODEL = "gpt-4o-mini"  # Which OpenAI model to use
 OLLAMA_MODEL = "llama3.1"     # Which Ollama model to use
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # keep the model (and its prompt KV cache) loaded between requests
 
 TOP_K       = 6                   # how many chunks to retrieve
 MAX_CONTEXT_CHARS = 5000           # safety to avoid overlong prompts
 MAX_HISTORY_MESSAGES = 6          # how many previous messages to include in context
 LLM_TEMPERATURE = 0.2              # 0 = deterministic, 1 = creative
+# HNSW candidate list size per query (src/migrations/add_documents_hnsw_index.sql);
+# higher = better recall, slower. pgvector's default is 40.
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+
+# Connection pool sizing (per process). PG_POOL_MAX must cover the number of
+# request threads per worker (gunicorn `threads`) plus a little headroom,
+# since ThreadedConnectionPool raises instead of blocking when exhausted.
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "2"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "20"))
+# Pooled connections idle longer than this are pinged before reuse; Supabase's
+# pooler and NAT gateways silently drop idle TCP connections.
+PG_POOL_PING_AFTER_SECONDS = int(os.getenv("PG_POOL_PING_AFTER_SECONDS", "300"))
+
+# Server-side prepared statements for the hot per-request queries. Off by
+# default: Supabase's transaction-mode pooler (port 6543) does not pin a
+# session to a backend, so a PREPAREd name may not exist on the next query.
+# Enable only with a direct or session-mode connection.
+PG_PREPARED_STATEMENTS = os.getenv("PG_PREPARED_STATEMENTS", "0") == "1"
+
+# Semantic answer cache (see src/migrations/create_qa_cache.sql). A standalone
+# question whose embedding is within SEMANTIC_CACHE_MAX_DISTANCE (cosine) of a
+# previously answered one, asked with the same student profile, reuses that answer.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "1") != "0"
+SEMANTIC_CACHE_MAX_DISTANCE = 0.08
+SEMANTIC_CACHE_TTL_HOURS = 24
+# In-process exact-match tier in front of it: the same normalized question with
+# the same profile skips even the embedding call and the qa_cache lookup.
+EXACT_CACHE_MAX_ENTRIES = int(os.getenv("EXACT_CACHE_MAX_ENTRIES", "512"))
+
+# Conversation history cache. Only used when REDIS_URL is set (and redis-py is installed).
+REDIS_URL = os.getenv("REDIS_URL")
+HISTORY_CACHE_TTL_SECONDS = 3600
 
 SCHOOL_LABELS = {
     "columbia_college": "Columbia College",
@@ -68,17 +119,170 @@ SCHOOL_SOURCE_PATTERNS = {
 # -------------------------------
 # Helpers
 # -------------------------------
-def get_pg_conn():
-   
-    
+def _pg_dsn() -> str:
     url = os.getenv("DATABASE_URL")
     if url:
         if "sslmode=" not in url:
             sep = "&" if "?" in url else "?"
             url = f"{url}{sep}sslmode=require"
-        return psycopg2.connect(url, cursor_factory=RealDictCursor)
+        return url
     raise SystemExit("Missing DB settings. Set DATABASE_URL in .env")
 
+
+def get_pg_conn():
+    """Open a standalone connection (for CLI scripts; the API uses pg_conn())."""
+    return psycopg2.connect(_pg_dsn(), cursor_factory=RealDictCursor)
+
+
+class PreparingConnection(PGConnection):
+    """Connection that remembers which statements it has PREPAREd and when it was last returned to the pool."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+        self.last_used = time.monotonic()
+
+
+_PLACEHOLDER_RE = re.compile(r"%s")
+
+
+def execute_prepared(cur, name: str, sql: str, params: tuple):
+    """
+    Execute `sql` (written with %s placeholders) as the prepared statement
+    `name`, issuing PREPARE the first time this connection sees it.
+    Falls back to a plain execute when PG_PREPARED_STATEMENTS is off or the
+    connection did not come from the pool.
+    """
+    prepared = getattr(cur.connection, "prepared", None)
+    if not PG_PREPARED_STATEMENTS or prepared is None:
+        cur.execute(sql, params)
+        return
+    if name not in prepared:
+        counter = iter(range(1, len(params) + 1))
+        body = _PLACEHOLDER_RE.sub(lambda _: f"${next(counter)}", sql.strip().rstrip(";"))
+        cur.execute(f"PREPARE {name} AS {body}")
+        prepared.add(name)
+    placeholders = ", ".join(["%s"] * len(params))
+    cur.execute(f"EXECUTE {name} ({placeholders})", params)
+
+
+_pg_pool: Optional[ThreadedConnectionPool] = None
+_pg_pool_lock = threading.Lock()
+
+
+def get_pg_pool() -> ThreadedConnectionPool:
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pg_pool
+    if _pg_pool is None:
+        with _pg_pool_lock:
+            if _pg_pool is None:
+                _pg_pool = ThreadedConnectionPool(
+                    PG_POOL_MIN,
+                    PG_POOL_MAX,
+                    _pg_dsn(),
+                    connection_factory=PreparingConnection,
+                    cursor_factory=RealDictCursor,
+                )
+                atexit.register(_pg_pool.closeall)
+    return _pg_pool
+
+
+def _is_alive(conn) -> bool:
+    """Cheap liveness check for a connection that has been sitting in the pool."""
+    if conn.closed:
+        return False
+    if time.monotonic() - getattr(conn, "last_used", 0) < PG_POOL_PING_AFTER_SECONDS:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1;")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+@contextmanager
+def pg_conn():
+    """
+    Borrow a pooled connection for the duration of a `with` block.
+    Connections that sat idle for a while are pinged first and replaced if
+    the server dropped them. Rolls back on error and always hands the
+    connection back to the pool (discarding it if it was closed underneath us).
+    """
+    pool = get_pg_pool()
+    conn = pool.getconn()
+    if not _is_alive(conn):
+        # Dropped while idle: discard it and open a fresh one
+        pool.putconn(conn, close=True)
+        conn = pool.getconn()
+    try:
+        yield conn
+    except Exception:
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+        raise
+    finally:
+        conn.last_used = time.monotonic()
+        pool.putconn(conn, close=bool(conn.closed))
+
+# The embeddings and chat clients are thread-safe and hold an HTTP connection
+# pool, so build them once per process and share them across requests instead
+# of paying a fresh client + TLS handshake on every question.
+@lru_cache(maxsize=None)
+def get_embedder() -> OpenAIEmbeddings:
+    """Return the shared query embeddings client."""
+    return OpenAIEmbeddings(model=EMBED_MODEL)
+
+
+@lru_cache(maxsize=None)
+def get_llm() -> tuple:
+    """Return the shared chat model and its display name, e.g. (llm, "openai:gpt-4o-mini")."""
+    if LLM_PROVIDER == "openai":
+        llm = ChatOpenAI(
+            model=OPENAI_MODELS[OPENAI_MODEL],
+            temperature=LLM_TEMPERATURE
+        )
+        return llm, f"openai:{OPENAI_MODEL}"
+    # ollama
+    from langchain_ollama import ChatOllama
+    llm = ChatOllama(
+        model=OLLAMA_MODELS[OLLAMA_MODEL],
+        base_url="http://localhost:11434",
+        temperature=LLM_TEMPERATURE,
+        keep_alive=OLLAMA_KEEP_ALIVE
+    )
+    return llm, f"ollama:{OLLAMA_MODEL}"
+
+# Per-process memo of query embeddings. Entries are float32 arrays (~6KB for
+# 1536 dims; a tuple of Python floats would be ~50KB), so the default costs ~12MB.
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "2048"))
+
+
+@lru_cache(maxsize=QUERY_EMBED_CACHE_SIZE)
+def _embed_query_cached(model: str, text: str) -> array:
+    return array("f", get_embedder().embed_query(text))
+
+
+def embed_query(text: str) -> array:
+    """
+    Embed a search query, memoized by (model, whitespace-normalized text), so
+    repeated/FAQ questions and the templated professor queries skip the
+    embeddings API. The result is shared between callers; don't mutate it.
+    """
+    return _embed_query_cached(EMBED_MODEL, " ".join(text.split()))
+
+
+# Background threads for the query embedding, so the OpenAI round-trip overlaps
+# with the profile/history queries instead of following them.
+_embed_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("EMBED_PREFETCH_WORKERS", "8")),
+    thread_name_prefix="embed-prefetch",
+)
+
 # -------------------------------
 # Conversation Management
 # -------------------------------
@@ -129,23 +333,13 @@ def get_user_profile(conn, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
         return None
     cur = conn.cursor()
     try:
-        cur.execute("""
+        execute_prepared(cur, "ask_alma_get_profile", """
             SELECT school, academic_year, major, minors, classes_taken, profile_image
             FROM user_profiles
             WHERE user_id = %s;
         """, (user_id,))
-        profile = cur.fetchone()
-        
-        # If no profile found, return None
-        if not profile:
-            return None
-            
-        # Ensure we return a dict (RealDictCursor should handle this, but be safe)
-        if not isinstance(profile, dict):
-            # Convert tuple to dict if needed
-            columns = ['school', 'academic_year', 'major', 'minors', 'classes_taken', 'profile_image']
-            profile = dict(zip(columns, profile))
-        return profile
+        # RealDictCursor rows are dicts; None if the user has no profile
+        return cur.fetchone()
     except Exception as e:
         print(f"Error fetching user profile for {user_id}: {e}")
         import traceback
@@ -155,10 +349,9 @@ def get_user_profile(conn, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
         cur.close()
 
 
-def get_conversation_history(conn, conversation_id: str, limit: int = MAX_HISTORY_MESSAGES) -> List[Dict[str, Any]]:
-    """Retrieve the last N messages from a conversation."""
+def _fetch_conversation_history(conn, conversation_id: str, limit: int) -> List[Dict[str, Any]]:
     cur = conn.cursor()
-    cur.execute("""
+    execute_prepared(cur, "ask_alma_get_history", """
         SELECT role, content, created_at, metadata
         FROM messages
         WHERE conversation_id = %s
@@ -171,15 +364,123 @@ def get_conversation_history(conn, conversation_id: str, limit: int = MAX_HISTOR
     return list(reversed(messages))
 
 
+_redis_client = None
+
+
+def get_redis():
+    """Return the shared Redis client, or None when the history cache is not configured."""
+    global _redis_client
+    if _redis_client is None and REDIS_URL and redis is not None:
+        _redis_client = redis.Redis.from_url(REDIS_URL)
+    return _redis_client
+
+
+def _history_cache_key(conversation_id: str) -> str:
+    return f"conv:{conversation_id}:messages"
+
+
+def invalidate_conversation_history(conversation_id: str):
+    """Drop cached history for a conversation after its messages change."""
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        client.delete(_history_cache_key(conversation_id))
+    except Exception as e:
+        print(f"Warning: could not invalidate history cache for {conversation_id}: {e}")
+
+
+def get_conversation_history(conn, conversation_id: str, limit: int = MAX_HISTORY_MESSAGES) -> List[Dict[str, Any]]:
+    """
+    Retrieve the last N messages from a conversation.
+    Cache-aside through Redis when REDIS_URL is set: the hash at
+    conv:{id}:messages holds one JSON-encoded list per limit and is
+    deleted whenever a message is added or the conversation is removed.
+    """
+    client = get_redis()
+    if client is None:
+        return _fetch_conversation_history(conn, conversation_id, limit)
+
+    key = _history_cache_key(conversation_id)
+    try:
+        cached = client.hget(key, limit)
+        if cached is not None:
+            messages = orjson.loads(cached)
+            for msg in messages:
+                if msg.get("created_at"):
+                    msg["created_at"] = datetime.fromisoformat(msg["created_at"])
+            return messages
+    except Exception as e:
+        print(f"Warning: history cache read failed for {conversation_id}: {e}")
+
+    messages = _fetch_conversation_history(conn, conversation_id, limit)
+    try:
+        pipe = client.pipeline()
+        pipe.hset(key, limit, orjson.dumps(messages))
+        pipe.expire(key, HISTORY_CACHE_TTL_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        print(f"Warning: history cache write failed for {conversation_id}: {e}")
+    return messages
+
+
 def save_message(conn, conversation_id: str, role: str, content: str, metadata: Dict[str, Any] = None):
     """Save a message to the conversation history."""
+    save_messages(conn, conversation_id, [(role, content, metadata)])
+
+
+def save_messages(conn, conversation_id: str, messages: List[tuple]):
+    """
+    Save several (role, content, metadata) messages in one INSERT and one commit.
+    created_at is taken from clock_timestamp() plus the row's position so the
+    messages keep their order even though they share a transaction.
+    """
+    rows = [
+        (conversation_id, role, content, json.dumps(metadata or {}), i)
+        for i, (role, content, metadata) in enumerate(messages)
+    ]
     cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO messages (conversation_id, role, content, metadata)
-        VALUES (%s, %s, %s, %s);
-    """, (conversation_id, role, content, json.dumps(metadata or {})))
+    execute_values(cur, """
+        INSERT INTO messages (conversation_id, role, content, metadata, created_at)
+        VALUES %s;
+    """, rows, template="(%s, %s, %s, %s, clock_timestamp() + %s * INTERVAL '1 microsecond')")
     conn.commit()
     cur.close()
+    invalidate_conversation_history(conversation_id)
+
+
+def _save_exchange(
+    conn,
+    conversation_id: str,
+    question: str,
+    answer: str,
+    rows: List[Dict[str, Any]],
+    profile_summary: Optional[str],
+    school_filter: Optional[tuple],
+    interrupted: bool = False,
+):
+    """Save the user question and the assistant answer (with retrieval metadata)."""
+    # Save assistant response with metadata about retrieved chunks
+    metadata = {
+        "top_matches": [
+            {
+                "id": row["id"],
+                "similarity": float(row["similarity"]),
+                "content_preview": row["content"][:200]
+            }
+            for row in rows[:5]  # Save top 5 matches
+        ]
+    }
+    if profile_summary:
+        metadata["student_profile_summary"] = profile_summary
+    if school_filter and rows:
+        metadata["school_filter_applied"] = school_filter
+    if interrupted:
+        metadata["interrupted"] = True
+    save_messages(conn, conversation_id, [
+        ("user", question, None),
+        ("assistant", answer, metadata),
+    ])
 
 
 def format_profile_summary(profile: Dict[str, Any]) -> Optional[str]:
@@ -218,7 +519,14 @@ def build_prompt(
     chat_history: List[Dict[str, Any]] = None,
     profile_summary: Optional[str] = None,
 ) -> str:
-    """Constructs a RAG prompt with optional chat history for llama3.1."""
+    """
+    Constructs a RAG prompt with optional chat history for llama3.1.
+
+    Everything that varies per request (profile, history, context, question)
+    comes after the fixed instructions, so the instruction block is an
+    identical prefix on every call. OpenAI's automatic prompt caching and
+    Ollama's KV-cache reuse only skip prefill for a shared prefix.
+    """
     context_text = "\n\n---\n\n".join(contexts)
     # Truncate context if it's too long
     context_text = context_text[:MAX_CONTEXT_CHARS]
@@ -256,7 +564,7 @@ def build_prompt(
     **IMPORTANT FOR SCHOOL-SPECIFIC QUESTIONS**: When a student's profile indicates a specific school, prioritize information accordingly:
     - For Columbia College or SEAS students: Prioritize information from both Columbia College and SEAS sources (they share many requirements and resources)
     - For Barnard students: Prioritize information from Barnard-specific sources
-    Look for school-specific requirements, terminology, and course listings in the context.{profile_text}
+    Look for school-specific requirements, terminology, and course listings in the context.
     
     ## WHEN TO USE CHAT HISTORY:
     **IMPORTANT**: Only reference chat history when the current question is DIRECTLY RELATED to previous conversation.
@@ -403,7 +711,7 @@ def build_prompt(
     
     ## FOR NON-ACADEMIC QUESTIONS:
     If asked something unrelated to academics/college life, give a brief, friendly response, then gently redirect to academic topics.
-    {history_text}
+    {profile_text}{history_text}
     ═══════════════════════════════════════════════════════════
     CONTEXT FROM COURSE BULLETINS, ACADEMIC REQUIREMENTS, AND PROFESSOR REVIEWS:
     ═══════════════════════════════════════════════════════════
@@ -433,6 +741,118 @@ def build_prompt(
     - Unrelated new question → Ignore chat history, focus on current question
     """)
 
+# -------------------------------
+# Semantic Answer Cache
+# -------------------------------
+def _profile_cache_key(profile_summary: Optional[str]) -> str:
+    """
+    Key cached answers by the profile text fed into the prompt, so a student
+    who updates their school, major, or classes_taken stops matching old entries.
+    """
+    if not profile_summary:
+        return ""
+    return hashlib.sha256(profile_summary.encode("utf-8")).hexdigest()[:16]
+
+
+_exact_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_exact_cache_lock = threading.Lock()
+
+
+def _exact_cache_key(question: str, profile_key: str) -> tuple:
+    # Case and whitespace differences shouldn't miss
+    return (" ".join(question.lower().split()), profile_key)
+
+
+def get_exact_cached_answer(question: str, profile_key: str) -> Optional[Dict[str, Any]]:
+    """Return an unexpired in-process cached answer for this exact question, if any."""
+    key = _exact_cache_key(question, profile_key)
+    with _exact_cache_lock:
+        entry = _exact_cache.get(key)
+        if entry is None:
+            return None
+        if entry["expires_at"] < time.monotonic():
+            del _exact_cache[key]
+            return None
+        _exact_cache.move_to_end(key)
+        return entry
+
+
+def put_exact_cached_answer(question: str, profile_key: str, answer: str, matches: List[Dict[str, Any]], model: str):
+    """Remember an answer in the exact-match tier, evicting the least recently used entry."""
+    key = _exact_cache_key(question, profile_key)
+    entry = {
+        "answer": answer,
+        "matches": matches,
+        "model": model,
+        "expires_at": time.monotonic() + SEMANTIC_CACHE_TTL_HOURS * 3600,
+    }
+    with _exact_cache_lock:
+        _exact_cache[key] = entry
+        _exact_cache.move_to_end(key)
+        while len(_exact_cache) > EXACT_CACHE_MAX_ENTRIES:
+            _exact_cache.popitem(last=False)
+
+
+def lookup_cached_answer(conn, vec_literal: str, profile_key: str) -> Optional[Dict[str, Any]]:
+    """Return the closest unexpired cached answer within SEMANTIC_CACHE_MAX_DISTANCE, if any."""
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT answer, matches, model, embedding <=> %s::vector AS distance
+            FROM qa_cache
+            WHERE profile_key = %s
+              AND expires_at > NOW()
+            ORDER BY distance
+            LIMIT 1;
+        """, (vec_literal, profile_key))
+        row = cur.fetchone()
+    except psycopg2.Error as e:
+        # A missing cache table must never break chat
+        conn.rollback()
+        print(f"Warning: semantic cache lookup failed: {e}")
+        return None
+    finally:
+        cur.close()
+
+    if row and row["distance"] <= SEMANTIC_CACHE_MAX_DISTANCE:
+        return row
+    return None
+
+
+def store_cached_answer(
+    conn,
+    question: str,
+    vec_literal: str,
+    profile_key: str,
+    answer: str,
+    matches: List[Dict[str, Any]],
+    model: str,
+):
+    """Insert a freshly generated answer (and its retrieved chunks) into the cache."""
+    cached_matches = [
+        {
+            "id": row["id"],
+            "content": row["content"],
+            "similarity": float(row["similarity"]),
+            "source": row.get("source"),
+        }
+        for row in matches
+    ]
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            INSERT INTO qa_cache (profile_key, question, embedding, answer, matches, model, expires_at)
+            VALUES (%s, %s, %s::vector, %s, %s, %s, NOW() + make_interval(hours => %s));
+        """, (profile_key, question, vec_literal, answer, json.dumps(cached_matches), model,
+              SEMANTIC_CACHE_TTL_HOURS))
+        conn.commit()
+    except psycopg2.Error as e:
+        conn.rollback()
+        print(f"Warning: could not store answer in semantic cache: {e}")
+    finally:
+        cur.close()
+
+
 # -------------------------------
 # Comparison Query Detection and Multi-Query Retrieval
 # -------------------------------
@@ -475,9 +895,85 @@ def detect_professor_comparison(question: str) -> Optional[tuple]:
     return None
 
 
+# ANN search settings, most capable first. SET LOCAL keeps them to this
+# request's transaction instead of leaking into the pooled connection.
+# hnsw.iterative_scan (pgvector >= 0.8) keeps walking the graph when the
+# school / professor filters discard candidates, so filtered queries still
+# return TOP_K rows; hnsw.ef_search needs pgvector >= 0.5.
+_ANN_SETTINGS = (
+    "set local ivfflat.probes = %(probes)s; set local hnsw.ef_search = %(ef_search)s;"
+    " set local hnsw.iterative_scan = relaxed_order;",
+    "set local ivfflat.probes = %(probes)s; set local hnsw.ef_search = %(ef_search)s;",
+    "set local ivfflat.probes = %(probes)s;",
+)
+_ann_settings_level = 0  # index of the first variant this server accepted
+_ann_settings_lock = threading.Lock()
+
+# undefined_object ("unrecognized configuration parameter") and
+# invalid_parameter_value: the server's pgvector doesn't support a setting
+_ANN_UNSUPPORTED_PGCODES = ("42704", "22023")
+
+
+def _tune_ann_search(cur, probes: int):
+    """Apply ANN recall settings for the current transaction (IVFFlat probes, HNSW ef_search)."""
+    global _ann_settings_level
+    params = {"probes": probes, "ef_search": HNSW_EF_SEARCH}
+    while True:
+        level = _ann_settings_level
+        if level >= len(_ANN_SETTINGS):
+            return
+        try:
+            # One round trip; on error the savepoint lets the transaction continue
+            cur.execute(
+                "savepoint ann_tuning; " + _ANN_SETTINGS[level] + " release savepoint ann_tuning;",
+                params,
+            )
+            return
+        except psycopg2.Error as e:
+            # Only an unsupported setting means older pgvector; anything else
+            # (timeout, cancellation, dropped connection) is not ours to absorb
+            if e.pgcode not in _ANN_UNSUPPORTED_PGCODES:
+                raise
+            cur.execute("rollback to savepoint ann_tuning;")
+            # Drop to the next variant and stop retrying this one. Compare
+            # first, so concurrent failures at one level only skip that level.
+            with _ann_settings_lock:
+                if _ann_settings_level == level:
+                    _ann_settings_level = level + 1
+                    fallback = "fewer settings" if level + 1 < len(_ANN_SETTINGS) else "server defaults"
+                    print(f"Warning: ANN search setting rejected ({str(e).strip()}); using {fallback} from now on")
+
+
+def to_vector_literal(vec) -> str:
+    """pgvector text literal for an embedding: [v1,v2,...]"""
+    return "[" + ",".join(f"{x:.8f}" for x in vec) + "]"
+
+
+def _nearest_sql(table_name: str, where: str = "") -> str:
+    """
+    Top-k similarity query over `table_name`. Params: (vector, *where params, limit).
+
+    The query vector is bound once (it used to be sent twice, for the
+    similarity column and for ORDER BY) - a 1536-dim literal is ~17KB of
+    text the server has to parse. Ordering by the `distance` alias is the same
+    `embedding <=> vector` expression, so the ANN index still drives the scan.
+    """
+    where_clause = f"where {where}" if where else ""
+    return f"""
+        select id, content, 1 - distance as similarity, source
+        from (
+            select id, content, source, embedding <=> %s::vector as distance
+            from {table_name}
+            {where_clause}
+            order by distance
+            limit %s
+        ) nearest
+        order by distance;
+    """
+
+
 def retrieve_for_professor(
     professor_name: str,
-    embedder: OpenAIEmbeddings,
     cur,
     table_name: str,
     school_filter: Optional[tuple],
@@ -489,8 +985,8 @@ def retrieve_for_professor(
     """
     # Create a targeted query for this professor
     prof_query = f"Professor {professor_name} teaching style reviews rating"
-    prof_vec = embedder.embed_query(prof_query)
-    vec_literal = "[" + ",".join(f"{x:.8f}" for x in prof_vec) + "]"
+    prof_vec = embed_query(prof_query)
+    vec_literal = to_vector_literal(prof_vec)
     prof_pattern = f"%{professor_name}%"
     
     # Search specifically for CULPA sources mentioning this professor
@@ -500,149 +996,61 @@ def retrieve_for_professor(
         if included_patterns:
             # Build OR conditions for included school sources
             included_conditions = " OR ".join(["source ILIKE %s"] * len(included_patterns))
-            sql = f"""
-                select
-                  id,
-                  content,
-                  1 - (embedding <=> %s::vector) as similarity,
-                  source
-                from {table_name}
-                where (({included_conditions}) OR source ILIKE 'culpa.info%%')
-                  and (content ILIKE %s OR source ILIKE %s)
-                order by embedding <=> %s::vector
-                limit %s;
-            """
-            params = [vec_literal] + included_patterns + [prof_pattern, prof_pattern, vec_literal, limit]
+            sql = _nearest_sql(table_name, f"""(({included_conditions}) OR source ILIKE 'culpa.info%%')
+                  and (content ILIKE %s OR source ILIKE %s)""")
+            params = [vec_literal] + included_patterns + [prof_pattern, prof_pattern, limit]
             cur.execute(sql, params)
         else:
             # Fallback: just search CULPA
-            sql = f"""
-                select
-                  id,
-                  content,
-                  1 - (embedding <=> %s::vector) as similarity,
-                  source
-                from {table_name}
-                where source ILIKE 'culpa.info%%'
-                  and (content ILIKE %s OR source ILIKE %s)
-                order by embedding <=> %s::vector
-                limit %s;
-            """
-            cur.execute(sql, (vec_literal, prof_pattern, prof_pattern, vec_literal, limit))
+            sql = _nearest_sql(table_name, """source ILIKE 'culpa.info%%'
+                  and (content ILIKE %s OR source ILIKE %s)""")
+            cur.execute(sql, (vec_literal, prof_pattern, prof_pattern, limit))
     else:
-        sql = f"""
-            select
-              id,
-              content,
-              1 - (embedding <=> %s::vector) as similarity,
-              source
-            from {table_name}
-            where (content ILIKE %s OR source ILIKE %s)
-            order by embedding <=> %s::vector
-            limit %s;
-        """
-        cur.execute(sql, (vec_literal, prof_pattern, prof_pattern, vec_literal, limit))
+        sql = _nearest_sql(table_name, "(content ILIKE %s OR source ILIKE %s)")
+        cur.execute(sql, (vec_literal, prof_pattern, prof_pattern, limit))
     
     return cur.fetchall()
 
 
-# -------------------------------
-# Main query function
-# -------------------------------
-def rag_answer(
-    question: str, 
-    conversation_id: Optional[str] = None,
-    user_id: Optional[str] = None,
-    table_name: str = "documents", 
+def retrieve_chunks(
+    conn,
+    question: str,
+    vec_literal: str,
+    school_filter: Optional[tuple],
+    table_name: str = "documents",
     probes: int = 10,
-    save_to_db: bool = True
-) -> dict:
-    """
-    1) Load conversation history (if conversation_id provided)
-    2) Embed the question with OpenAI embeddings
-    3) Retrieve TOP_K most similar chunks from pgvector (cosine distance)
-    4) Generate an answer with llama3.1 using retrieved context + chat history
-    5) Save the question and answer to the database (if save_to_db=True)
-    
-    Args:
-        question: User's question
-        conversation_id: UUID of existing conversation, or None to create new one
-        table_name: Name of the documents table
-        probes: IVFFlat probes parameter for search accuracy
-        save_to_db: Whether to save messages to database
-    
-    Returns:
-        Dictionary with answer, matches, conversation_id, and other metadata
-    """
-    # Connect to database
-    conn = get_pg_conn()
-    
-    # Fetch user profile (with error handling)
-    profile = None
-    try:
-        profile = get_user_profile(conn, user_id) if user_id else None
-    except Exception as e:
-        print(f"Warning: Could not fetch user profile: {e}")
-        profile = None
-    
-    profile_summary = format_profile_summary(profile) if profile else None
-    
-    # 1) Handle conversation
-    chat_history = []
-    if conversation_id:
-        # Load existing conversation history
-        chat_history = get_conversation_history(conn, conversation_id)
-    elif save_to_db:
-        # Create a new conversation
-        conversation_id = create_conversation(conn, user_id=user_id)
-    
-    # 2) Get query embedding
-    embedder = OpenAIEmbeddings(model=EMBED_MODEL)
-    q_vec = embedder.embed_query(question)  # -> list[float]
-
-    # 3) Retrieve from Postgres
+) -> List[Dict[str, Any]]:
+    """Retrieve the TOP_K chunks most similar to the question, honoring the school filter."""
     cur = conn.cursor()
 
-    # Improve ANN recall (IVFFlat): set probes (tune 5-20)
-    try:
-        cur.execute("set ivfflat.probes = %s;", (probes,))
-    except Exception:
-        pass  # if extension/version doesn't support it, ignore
-
-    # Query top-k (cosine distance). Similarity = 1 - distance.
-    vec_literal = "[" + ",".join(f"{x:.8f}" for x in q_vec) + "]"
+    _tune_ann_search(cur, probes)
 
     rows = []
-    # Get school filter safely
-    school_value = None
-    if profile and isinstance(profile, dict):
-        school_value = profile.get("school")
-    school_filter = get_school_source_filter(school_value)
-    
+
     # Check if this is a professor comparison query
     comparison = detect_professor_comparison(question)
-    
+
     if comparison:
         # Multi-query retrieval for fair comparison
         prof1, prof2 = comparison
         print(f"[DEBUG] Detected comparison: {prof1} vs {prof2}")
-        
+    
         # Retrieve TOP_K/2 results for each professor
         per_prof_limit = TOP_K // 2
-        
-        prof1_rows = retrieve_for_professor(prof1, embedder, cur, table_name, school_filter, per_prof_limit)
-        prof2_rows = retrieve_for_professor(prof2, embedder, cur, table_name, school_filter, per_prof_limit)
-        
+    
+        prof1_rows = retrieve_for_professor(prof1, cur, table_name, school_filter, per_prof_limit)
+        prof2_rows = retrieve_for_professor(prof2, cur, table_name, school_filter, per_prof_limit)
+    
         # Combine results, avoiding duplicates
         seen_ids = set()
         for row in prof1_rows + prof2_rows:
             if row["id"] not in seen_ids:
                 rows.append(row)
                 seen_ids.add(row["id"])
-        
+    
         # Sort by similarity
         rows = sorted(rows, key=lambda x: x["similarity"], reverse=True)[:TOP_K]
-        
+    
         print(f"[DEBUG] Retrieved {len(prof1_rows)} chunks for {prof1}, {len(prof2_rows)} chunks for {prof2}")
     else:
         # Normal single-query retrieval
@@ -650,43 +1058,23 @@ def rag_answer(
         # IMPORTANT: Always include CULPA (professor reviews) regardless of school
         if school_filter:
             included_patterns, excluded_patterns = school_filter
-            
+        
             # Build SQL with OR conditions for included patterns
             if included_patterns:
                 # Create OR conditions for included school sources
                 included_conditions = " OR ".join(["source ILIKE %s"] * len(included_patterns))
-                school_sql = f"""
-                    select
-                      id,
-                      content,
-                      1 - (embedding <=> %s::vector) as similarity,
-                      source
-                    from {table_name}
-                    where (({included_conditions}) OR source ILIKE 'culpa.info%%')
-                    order by embedding <=> %s::vector
-                    limit %s;
-                """
-                params = [vec_literal] + included_patterns + [vec_literal, TOP_K]
+                school_sql = _nearest_sql(table_name, f"(({included_conditions}) OR source ILIKE 'culpa.info%%')")
+                params = [vec_literal] + included_patterns + [TOP_K]
                 cur.execute(school_sql, params)
             else:
                 # Fallback to old behavior if no included patterns
-                school_sql = f"""
-                    select
-                      id,
-                      content,
-                      1 - (embedding <=> %s::vector) as similarity,
-                      source
-                    from {table_name}
-                    where source ILIKE 'culpa.info%%'
-                    order by embedding <=> %s::vector
-                    limit %s;
-                """
-                cur.execute(school_sql, (vec_literal, vec_literal, TOP_K))
-            
+                school_sql = _nearest_sql(table_name, "source ILIKE 'culpa.info%%'")
+                cur.execute(school_sql, (vec_literal, TOP_K))
+        
             school_rows = cur.fetchall()
             rows.extend(school_rows)
             existing_ids = {row["id"] for row in rows}
-            
+        
             # Step 2: If we don't have enough school-specific results, fill with general results
             # This catches other schools' data + any CULPA sources not already retrieved
             # Exclude the excluded patterns (e.g., Barnard for Columbia students, or Columbia for Barnard students)
@@ -695,34 +1083,14 @@ def rag_answer(
                 if excluded_patterns:
                     # Build NOT conditions for excluded patterns
                     excluded_conditions = " AND ".join(["source NOT ILIKE %s"] * len(excluded_patterns))
-                    general_sql = f"""
-                        select
-                          id,
-                          content,
-                          1 - (embedding <=> %s::vector) as similarity,
-                          source
-                        from {table_name}
-                        where ({excluded_conditions} OR source ILIKE 'culpa.info%%')
-                        order by embedding <=> %s::vector
-                        limit %s;
-                    """
-                    params = excluded_patterns + [vec_literal, vec_literal, remaining]
+                    general_sql = _nearest_sql(table_name, f"({excluded_conditions} OR source ILIKE 'culpa.info%%')")
+                    params = [vec_literal] + excluded_patterns + [remaining]
                     cur.execute(general_sql, params)
                 else:
                     # No exclusions, get all sources
-                    general_sql = f"""
-                        select
-                          id,
-                          content,
-                          1 - (embedding <=> %s::vector) as similarity,
-                          source
-                        from {table_name}
-                        where source ILIKE 'culpa.info%%'
-                        order by embedding <=> %s::vector
-                        limit %s;
-                    """
-                    cur.execute(general_sql, (vec_literal, vec_literal, remaining))
-                
+                    general_sql = _nearest_sql(table_name, "source ILIKE 'culpa.info%%'")
+                    cur.execute(general_sql, (vec_literal, remaining))
+            
                 general_rows = cur.fetchall()
                 # Add general results, avoiding duplicates
                 for row in general_rows:
@@ -731,75 +1099,176 @@ def rag_answer(
                         existing_ids.add(row["id"])
                         if len(rows) >= TOP_K:
                             break
-            
+        
             # Sort by similarity to ensure best results are first
             rows = sorted(rows, key=lambda x: x["similarity"], reverse=True)[:TOP_K]
         else:
             # No school filter - get general results
-            base_sql = f"""
-                select
-                  id,
-                  content,
-                  1 - (embedding <=> %s::vector) as similarity,
-                  source
-                from {table_name}
-                order by embedding <=> %s::vector
-                limit %s;
-            """
-            cur.execute(base_sql, (vec_literal, vec_literal, TOP_K))
+            base_sql = _nearest_sql(table_name)
+            cur.execute(base_sql, (vec_literal, TOP_K))
             rows = cur.fetchall()
 
     cur.close()
+    return rows
 
-    contexts = [row["content"] for row in rows]
-    
-    # 4) Build prompt with chat history
-    prompt = build_prompt(question, contexts, chat_history, profile_summary)
 
+# -------------------------------
+# Main query function
+# -------------------------------
+def rag_answer(
+    question: str, 
+    conversation_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    table_name: str = "documents", 
+    probes: int = 10,
+    save_to_db: bool = True
+) -> dict:
+    """
+    1) Load conversation history (if conversation_id provided)
+    2) Embed the question with OpenAI embeddings
+    3) Retrieve TOP_K most similar chunks from pgvector (cosine distance)
+    4) Generate an answer with llama3.1 using retrieved context + chat history
+    5) Save the question and answer to the database (if save_to_db=True)
     
-
-    # 5) Generate answer with chosen LLM
-    if LLM_PROVIDER == "openai":
-        llm = ChatOpenAI(
-            model=OPENAI_MODELS[OPENAI_MODEL],
-            temperature=LLM_TEMPERATURE
-        )
-        gen_model_name = f"openai:{OPENAI_MODEL}"
-    else:  # ollama
-        llm = ChatOllama(
-            model=OLLAMA_MODELS[OLLAMA_MODEL],
-            base_url="http://localhost:11434",
-            temperature=LLM_TEMPERATURE
-        )
-        gen_model_name = f"ollama:{OLLAMA_MODEL}"
+    Args:
+        question: User's question
+        conversation_id: UUID of existing conversation, or None to create new one
+        table_name: Name of the documents table
+        probes: IVFFlat probes parameter for search accuracy
+        save_to_db: Whether to save messages to database
     
-    answer = llm.invoke(prompt).content
+    Returns:
+        Dictionary with answer, matches, conversation_id, and other metadata
+    """
+    for kind, payload in rag_answer_stream(
+        question,
+        conversation_id=conversation_id,
+        user_id=user_id,
+        table_name=table_name,
+        probes=probes,
+        save_to_db=save_to_db,
+    ):
+        if kind == "done":
+            return payload
 
-    # 6) Save to database
-    if save_to_db and conversation_id:
-        # Save user message
-        save_message(conn, conversation_id, "user", question)
-        
-        # Save assistant response with metadata about retrieved chunks
-        metadata = {
-            "top_matches": [
-                {
-                    "id": row["id"],
-                    "similarity": float(row["similarity"]),
-                    "content_preview": row["content"][:200]
-                }
-                for row in rows[:5]  # Save top 5 matches
-            ]
-        }
-        if profile_summary:
-            metadata["student_profile_summary"] = profile_summary
-        if school_filter and rows:
-            metadata["school_filter_applied"] = school_filter
-        save_message(conn, conversation_id, "assistant", answer, metadata)
+
+def rag_answer_stream(
+    question: str,
+    conversation_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    table_name: str = "documents",
+    probes: int = 10,
+    save_to_db: bool = True
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Same pipeline as rag_answer, but yields the answer as the LLM produces it.
+
+    Yields ("token", text) for each piece of the answer, then a single
+    ("done", result) where result is the dict rag_answer returns. A cached
+    answer arrives as one token.
+    """
+    # Borrow a pooled database connection for the whole request
+    with pg_conn() as conn:
     
-    conn.close()
+        # Fetch user profile (with error handling)
+        profile = None
+        try:
+            profile = get_user_profile(conn, user_id) if user_id else None
+        except Exception as e:
+            print(f"Warning: Could not fetch user profile: {e}")
+            profile = None
+    
+        profile_summary = format_profile_summary(profile) if profile else None
+        profile_key = _profile_cache_key(profile_summary)
+
+        # A new conversation has no history, so the exact-match tier can answer
+        # it already; checking before the embedding is submitted means a hit
+        # never pays for the embedding call
+        new_conversation = conversation_id is None
+        cached = None
+        if new_conversation and SEMANTIC_CACHE_ENABLED:
+            cached = get_exact_cached_answer(question, profile_key)
+
+        # Otherwise start embedding the question now, so it overlaps the
+        # conversation queries below
+        q_vec_future = None if cached else _embed_executor.submit(embed_query, question)
+    
+        # 1) Handle conversation
+        chat_history = []
+        if conversation_id:
+            # Load existing conversation history
+            chat_history = get_conversation_history(conn, conversation_id)
+        elif save_to_db:
+            # Create a new conversation
+            conversation_id = create_conversation(conn, user_id=user_id)
+    
+        # Get school filter safely
+        school_value = None
+        if profile and isinstance(profile, dict):
+            school_value = profile.get("school")
+        school_filter = get_school_source_filter(school_value)
+
+        # Follow-ups depend on chat history, so only standalone questions are cached
+        use_cache = SEMANTIC_CACHE_ENABLED and not chat_history
+        if use_cache and not new_conversation:
+            # An existing conversation that has no messages yet
+            cached = get_exact_cached_answer(question, profile_key)
+
+        if cached:
+            if q_vec_future:
+                q_vec_future.cancel()
+        else:
+            # 2) Get query embedding (started before the DB work above)
+            q_vec = q_vec_future.result()  # -> float32 array
+
+            # Query top-k (cosine distance). Similarity = 1 - distance.
+            vec_literal = to_vector_literal(q_vec)
+
+            if use_cache:
+                cached = lookup_cached_answer(conn, vec_literal, profile_key)
+                if cached:
+                    put_exact_cached_answer(question, profile_key, cached["answer"], cached["matches"], cached["model"])
+
+        rows, parts = [], []
+        try:
+            if cached:
+                rows = cached["matches"]
+                gen_model_name = cached["model"]
+                parts.append(cached["answer"])
+                yield "token", cached["answer"]
+            else:
+                # 3) Retrieve from Postgres
+                rows = retrieve_chunks(conn, question, vec_literal, school_filter, table_name, probes)
+                contexts = [row["content"] for row in rows]
+
+                # 4) Build prompt with chat history
+                prompt = build_prompt(question, contexts, chat_history, profile_summary)
+
+                # 5) Generate answer with chosen LLM
+                llm, gen_model_name = get_llm()
+                for chunk in llm.stream(prompt):
+                    if chunk.content:
+                        parts.append(chunk.content)
+                        yield "token", chunk.content
+        except GeneratorExit:
+            # The consumer closed us mid-answer (client disconnected or
+            # cancelled): stop generating, but keep the question and the
+            # partial answer so the conversation isn't left without a reply.
+            if save_to_db and conversation_id and parts:
+                _save_exchange(conn, conversation_id, question, "".join(parts), rows,
+                               profile_summary, school_filter, interrupted=True)
+            raise
+        answer = "".join(parts)
+
+        if use_cache and not cached:
+            store_cached_answer(conn, question, vec_literal, profile_key, answer, rows, gen_model_name)
+            put_exact_cached_answer(question, profile_key, answer, rows, gen_model_name)
+
+        # 6) Save to database (user question + assistant answer in one round-trip)
+        if save_to_db and conversation_id:
+            _save_exchange(conn, conversation_id, question, answer, rows, profile_summary, school_filter)
 
-    return {
+    yield "done", {
         "conversation_id": conversation_id,
         "question": question,
         "answer": answer,
@@ -6,7 +6,7 @@ by matching chunk content from the chunked JSONL file.
 
 import os
 import sys
-import json
+import orjson
 import hashlib
 from tqdm import tqdm
 from dotenv import load_dotenv
@@ -41,10 +41,10 @@ chunked_file = os.path.join(os.path.dirname(__file__), "..", "..", "chunked_all_
 print(f"Loading source mappings from {chunked_file}...")
 
 id_to_source = {}
-with open(chunked_file, "r", encoding="utf-8") as f:
+with open(chunked_file, "rb") as f:
     for line in tqdm(f, desc="Reading chunks"):
         if line.strip():
-            data = json.loads(line)
+            data = orjson.loads(line)
             text = data.get("text", "") or data.get("page_content", "")
             source = data.get("source", "unknown")
             chunk_id = _hash_text(text)
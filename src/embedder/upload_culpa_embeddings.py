@@ -10,7 +10,7 @@ import numpy as np
 from tqdm import tqdm
 from dotenv import load_dotenv
 import psycopg2
-from psycopg2.extras import execute_values
+from pg_copy import create_staging_table, copy_rows, upsert_from_staging
 
 # ------------------------
 # Config & helpers
@@ -19,12 +19,6 @@ EMB_PATH = "emb_out/openai_text-embedding-3-small.npy"
 META_PATH = "emb_out/openai_text-embedding-3-small.meta.tsv"
 TABLE_NAME = "documents"
 
-def to_vector_literal(vec: np.ndarray) -> str:
-    """
-    Convert a 1D numpy array to pgvector literal: [v1,v2,...]
-    """
-    return "[" + ",".join(f"{float(x):.8f}" for x in vec.tolist()) + "]"
-
 # ------------------------
 # Load env & connect
 # ------------------------
@@ -90,9 +84,9 @@ try:
 
     # Create index if not exists
     cur.execute(f"""
-        create index if not exists {TABLE_NAME}_embedding_cosine_idx
-          on {TABLE_NAME} using ivfflat (embedding vector_cosine_ops)
-          with (lists = 100);
+        create index if not exists {TABLE_NAME}_embedding_hnsw_idx
+          on {TABLE_NAME} using hnsw (embedding vector_cosine_ops)
+          with (m = 16, ef_construction = 64);
     """)
     print("✓ Index ready.")
 except Exception as e:
@@ -140,19 +134,19 @@ except Exception as e:
     sys.exit(f"Failed to delete old CULPA documents: {e}")
 
 # ------------------------
-# Bulk insert in batches
+# Bulk insert in batches (binary COPY into a staging table)
 # ------------------------
 BATCH = 500
 print(f"\nInserting {n_rows} CULPA chunks in batches of {BATCH}...")
 
 try:
     conn.autocommit = False
-    inserted_count = 0
+    create_staging_table(cur, TABLE_NAME)
+    seen_ids = set()  # One row per id, or the final upsert would hit it twice
     
     for start in tqdm(range(0, n_rows, BATCH), desc="Uploading"):
         end = min(start + BATCH, n_rows)
         batch_rows = []
-        seen_ids = set()
 
         for i in range(start, end):
             # Skip duplicates
@@ -160,32 +154,21 @@ try:
                 continue
             
             seen_ids.add(ids[i])
-            vec_literal = to_vector_literal(emb[i])
             batch_rows.append((
                 ids[i],
                 texts[i],
                 sources[i] if i < len(sources) else "unknown",
                 "text-embedding-3-small",
-                vec_literal,
+                emb[i],
             ))
 
         if not batch_rows:
             continue
 
-        # Insert with conflict resolution
-        insert_sql = f"""
-            insert into {TABLE_NAME} (id, content, source, model, embedding)
-            values %s
-            on conflict (id) do update set
-              content = excluded.content,
-              source  = excluded.source,
-              model   = excluded.model,
-              embedding = excluded.embedding,
-              created_at = now();
-        """
-        template = "(%s, %s, %s, %s, %s::vector)"
-        execute_values(cur, insert_sql, batch_rows, template=template)
-        inserted_count += len(batch_rows)
+        copy_rows(cur, batch_rows)
+
+    # Insert with conflict resolution
+    inserted_count = upsert_from_staging(cur, TABLE_NAME)
 
     # Refresh planner stats
     cur.execute(f"analyze {TABLE_NAME};")
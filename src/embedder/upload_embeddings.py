@@ -4,7 +4,7 @@ import numpy as np
 from tqdm import tqdm
 from dotenv import load_dotenv
 import psycopg2
-from psycopg2.extras import execute_values
+from pg_copy import create_staging_table, copy_rows, upsert_from_staging
 
 # ------------------------
 # Config & helpers
@@ -13,167 +13,173 @@ EMB_PATH = "emb_out/openai_text-embedding-3-small.npy"
 META_PATH = "emb_out/openai_text-embedding-3-small.meta.tsv"
 TABLE_NAME = "documents"  # change if you want a different table
 
-def to_vector_literal(vec: np.ndarray) -> str:
-    """
-    Convert a 1D numpy array to pgvector literal: [v1,v2,...]
-    """
-    return "[" + ",".join(f"{float(x):.8f}" for x in vec.tolist()) + "]"
 
 # ------------------------
 # Load env & connect
 # ------------------------
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    sys.exit("DATABASE_URL not set in .env")
-
-# Ensure SSL (Supabase requires it)
-if "sslmode=" not in DATABASE_URL:
-    sep = "&" if "?" in DATABASE_URL else "?"
-    DATABASE_URL = f"{DATABASE_URL}{sep}sslmode=require"
-
-try:
-    conn = psycopg2.connect(DATABASE_URL)
-    conn.autocommit = True  # for DDL convenience
-    cur = conn.cursor()
-    print("Connected to Supabase Postgres.")
-except Exception as e:
-    sys.exit(f"Failed to connect: {e}")
+def connect():
+    load_dotenv()
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        sys.exit("DATABASE_URL not set in .env")
+
+    # Ensure SSL (Supabase requires it)
+    if "sslmode=" not in database_url:
+        sep = "&" if "?" in database_url else "?"
+        database_url = f"{database_url}{sep}sslmode=require"
+
+    try:
+        conn = psycopg2.connect(database_url)
+        conn.autocommit = True  # for DDL convenience
+        print("Connected to Supabase Postgres.")
+        return conn
+    except Exception as e:
+        sys.exit(f"Failed to connect: {e}")
+
 
 # ------------------------
-# Ensure extension/table/index
+# Load embeddings & metadata
 # ------------------------
-try:
-    cur.execute("create extension if not exists vector;")
-    print("pgvector ready.")
-
-    # Load embeddings to get dimension
-    emb = np.load(EMB_PATH)  # shape: (N, D)
-    if emb.ndim != 2:
-        raise ValueError(f"Unexpected embeddings shape: {emb.shape}")
-    n_rows, dim = emb.shape
+def load_bundle(emb_path=EMB_PATH, meta_path=META_PATH):
+    """Read a save_numpy_bundle() .npy/.meta.tsv pair -> (emb, ids, texts, sources)."""
+    try:
+        emb = np.load(emb_path)  # shape: (N, D)
+    except Exception as e:
+        sys.exit(f"Failed to load embeddings: {e}")
     print(f"Embeddings loaded: shape={emb.shape}")
 
-    # Create table (id/content/source/model/embedding)
-    cur.execute(f"""
-        create table if not exists {TABLE_NAME} (
-          id text primary key,
-          content text not null,
-          source text default 'manual',
-          model  text default 'text-embedding-3-small',
-          embedding vector({dim}) not null,
-          created_at timestamptz default now()
-        );
-    """)
-    print(f"Table '{TABLE_NAME}' ready.")
-
-    # ANN index for cosine distance (IVFFlat). Tune lists as needed.
-    cur.execute(f"""
-        create index if not exists {TABLE_NAME}_embedding_cosine_idx
-          on {TABLE_NAME} using ivfflat (embedding vector_cosine_ops)
-          with (lists = 100);
-    """)
-    print("Index ready.")
-except Exception as e:
-    cur.close()
-    conn.close()
-    sys.exit(f"Failed to prepare database objects: {e}")
+    ids, texts, sources = [], [], []
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                _id = parts[0]
+                text = parts[1] if len(parts) > 1 else ""
+                source = parts[2] if len(parts) > 2 else "unknown"
+                ids.append(_id)
+                texts.append(text)
+                sources.append(source)
+    except Exception as e:
+        sys.exit(f"Failed to read meta file: {e}")
 
-# ------------------------
-# Load metadata & sanity checks
-# ------------------------
-ids, texts, sources = [], [], []
-try:
-    with open(META_PATH, "r", encoding="utf-8") as f:
-        for line in f:
-            parts = line.rstrip("\n").split("\t")
-            _id = parts[0]
-            text = parts[1] if len(parts) > 1 else ""
-            source = parts[2] if len(parts) > 2 else "unknown"
-            ids.append(_id)
-            texts.append(text)
-            sources.append(source)
-except Exception as e:
-    cur.close()
-    conn.close()
-    sys.exit(f"Failed to read meta file: {e}")
+    return emb, ids, texts, sources
 
-if len(ids) != n_rows:
-    cur.close()
-    conn.close()
-    sys.exit(f"Row mismatch: {len(ids)} meta lines vs {n_rows} embedding rows")
 
 # ------------------------
-# Delete all existing embeddings first
+# Replace the table contents
 # ------------------------
-print("Deleting all existing embeddings from Supabase...")
-try:
-    cur.execute(f"delete from {TABLE_NAME};")
-    deleted_count = cur.rowcount
-    print(f"✓ Deleted {deleted_count} old embeddings.")
-except Exception as e:
-    cur.close()
-    conn.close()
-    sys.exit(f"Failed to delete old embeddings: {e}")
+def upload(emb, ids, texts, sources):
+    """Replace everything in TABLE_NAME with these rows (emb is an (N, D) float array)."""
+    if emb.ndim != 2:
+        sys.exit(f"Unexpected embeddings shape: {emb.shape}")
+    n_rows, dim = emb.shape
+    if len(ids) != n_rows:
+        sys.exit(f"Row mismatch: {len(ids)} meta lines vs {n_rows} embedding rows")
 
-# ------------------------
-# Bulk upsert in batches
-# ------------------------
-BATCH = 500
-print(f"Upserting {n_rows} rows in batches of {BATCH}...")
-
-try:
-    # Switch to transactional mode for batch speed
-    conn.autocommit = False
-    for start in tqdm(range(0, n_rows, BATCH)):
-        end = min(start + BATCH, n_rows)
-        batch_rows = []
-        seen_ids = set()  # Track IDs in this batch to avoid duplicates
-
-        for i in range(start, end):
-            # Skip if we've already added this ID in the current batch
-            if ids[i] in seen_ids:
+    conn = connect()
+    cur = conn.cursor()
+
+    # ------------------------
+    # Ensure extension/table/index
+    # ------------------------
+    try:
+        cur.execute("create extension if not exists vector;")
+        print("pgvector ready.")
+
+        # Create table (id/content/source/model/embedding)
+        cur.execute(f"""
+            create table if not exists {TABLE_NAME} (
+              id text primary key,
+              content text not null,
+              source text default 'manual',
+              model  text default 'text-embedding-3-small',
+              embedding vector({dim}) not null,
+              created_at timestamptz default now()
+            );
+        """)
+        print(f"Table '{TABLE_NAME}' ready.")
+
+        # ANN index for cosine distance (HNSW). Unlike IVFFlat it needs no training
+        # data, so creating it on an empty table is fine.
+        cur.execute(f"""
+            create index if not exists {TABLE_NAME}_embedding_hnsw_idx
+              on {TABLE_NAME} using hnsw (embedding vector_cosine_ops)
+              with (m = 16, ef_construction = 64);
+        """)
+        print("Index ready.")
+    except Exception as e:
+        cur.close()
+        conn.close()
+        sys.exit(f"Failed to prepare database objects: {e}")
+
+    # ------------------------
+    # Delete all existing embeddings first
+    # ------------------------
+    print("Deleting all existing embeddings from Supabase...")
+    try:
+        cur.execute(f"delete from {TABLE_NAME};")
+        deleted_count = cur.rowcount
+        print(f"✓ Deleted {deleted_count} old embeddings.")
+    except Exception as e:
+        cur.close()
+        conn.close()
+        sys.exit(f"Failed to delete old embeddings: {e}")
+
+    # ------------------------
+    # Bulk upsert in batches (binary COPY into a staging table)
+    # ------------------------
+    BATCH = 500
+    print(f"Upserting {n_rows} rows in batches of {BATCH}...")
+
+    try:
+        # Switch to transactional mode for batch speed
+        conn.autocommit = False
+        create_staging_table(cur, TABLE_NAME)
+        seen_ids = set()  # One row per id, or the final upsert would hit it twice
+
+        for start in tqdm(range(0, n_rows, BATCH)):
+            end = min(start + BATCH, n_rows)
+            batch_rows = []
+
+            for i in range(start, end):
+                # Skip if we've already staged this ID
+                if ids[i] in seen_ids:
+                    continue
+
+                seen_ids.add(ids[i])
+                batch_rows.append((
+                    ids[i],
+                    texts[i],
+                    sources[i] if i < len(sources) else "unknown",  # source from metadata
+                    "text-embedding-3-small",   # model (keep consistent)
+                    emb[i],               # float32 row, sent in pgvector binary format
+                ))
+
+            # Skip empty batches
+            if not batch_rows:
                 continue
-            
-            seen_ids.add(ids[i])
-            vec_literal = to_vector_literal(emb[i])
-            batch_rows.append((
-                ids[i],
-                texts[i],
-                sources[i] if i < len(sources) else "unknown",  # source from metadata
-                "text-embedding-3-small",   # model (keep consistent)
-                vec_literal,          # vector literal for pgvector
-            ))
-
-        # Skip empty batches
-        if not batch_rows:
-            continue
-
-        # Fast bulk upsert with execute_values
-        insert_sql = f"""
-            insert into {TABLE_NAME} (id, content, source, model, embedding)
-            values %s
-            on conflict (id) do update set
-              content = excluded.content,
-              source  = excluded.source,
-              model   = excluded.model,
-              embedding = excluded.embedding,
-              created_at = now();
-        """
-        # Note: we cast the 5th column to vector in the template
-        template = "(%s, %s, %s, %s, %s::vector)"
-        execute_values(cur, insert_sql, batch_rows, template=template)
-
-    # Refresh planner stats for better ANN behavior
-    cur.execute(f"analyze {TABLE_NAME};")
-    conn.commit()
-    print("Upsert complete.")
-except Exception as e:
-    conn.rollback()
+
+            copy_rows(cur, batch_rows)
+
+        upserted = upsert_from_staging(cur, TABLE_NAME)
+        # Refresh planner stats for better ANN behavior
+        cur.execute(f"analyze {TABLE_NAME};")
+        conn.commit()
+        print(f"Upsert complete ({upserted} rows).")
+    except Exception as e:
+        conn.rollback()
+        cur.close()
+        conn.close()
+        sys.exit(f"Upsert failed: {e}")
+
     cur.close()
     conn.close()
-    sys.exit(f"Upsert failed: {e}")
+    print("Connection closed.")
+
+
+def main(emb_path=EMB_PATH, meta_path=META_PATH):
+    upload(*load_bundle(emb_path, meta_path))
+
 
-cur.close()
-conn.close()
-print("Connection closed.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
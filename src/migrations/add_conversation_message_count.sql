@@ -0,0 +1,41 @@
+-- Migration: Denormalize message_count onto conversations
+-- The sidebar list/search endpoints used to LEFT JOIN messages and COUNT per
+-- request; a trigger-maintained counter lets them read conversations alone.
+
+ALTER TABLE conversations
+    ADD COLUMN IF NOT EXISTS message_count INT NOT NULL DEFAULT 0;
+
+-- Backfill existing conversations
+UPDATE conversations c
+SET message_count = sub.cnt
+FROM (
+    SELECT conversation_id, COUNT(*) AS cnt
+    FROM messages
+    GROUP BY conversation_id
+) sub
+WHERE c.id = sub.conversation_id;
+
+CREATE OR REPLACE FUNCTION update_conversation_message_count()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE conversations
+        SET message_count = message_count + 1
+        WHERE id = NEW.conversation_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE conversations
+        SET message_count = GREATEST(message_count - 1, 0)
+        WHERE id = OLD.conversation_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS msg_count ON messages;
+CREATE TRIGGER msg_count
+    AFTER INSERT OR DELETE ON messages
+    FOR EACH ROW
+    EXECUTE FUNCTION update_conversation_message_count();
+
+-- Same as add_user_id_migration.sql; kept here so this migration stands alone
+CREATE INDEX IF NOT EXISTS idx_conversations_user_updated ON conversations(user_id, updated_at DESC);
@@ -0,0 +1,20 @@
+-- Migration: HNSW index for document retrieval
+-- The upload scripts created an IVFFlat index (lists = 100) before any rows
+-- were loaded, so its centroids were trained on an empty table and recall
+-- depended on ivfflat.probes. HNSW needs no training, stays accurate as rows
+-- are added, and is tuned per query with hnsw.ef_search (set in rag_query.py).
+
+DROP INDEX IF EXISTS documents_embedding_cosine_idx;
+
+CREATE INDEX IF NOT EXISTS documents_embedding_hnsw_idx
+    ON documents USING hnsw (embedding vector_cosine_ops)
+    WITH (m = 16, ef_construction = 64);
+
+-- Professor comparisons filter on content ILIKE '%name%'; a trigram index
+-- lets the planner pick those few rows before ranking by distance.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS documents_content_trgm_idx
+    ON documents USING gin (content gin_trgm_ops);
+
+ANALYZE documents;
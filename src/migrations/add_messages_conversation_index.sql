@@ -0,0 +1,8 @@
+-- Migration: Index messages by conversation, newest first
+-- Serves every per-conversation message lookup without scanning messages:
+-- the history fetch (ORDER BY created_at DESC LIMIT n), the search EXISTS
+-- subquery, the latest-message lookup in conversation_utils, and the
+-- ON DELETE CASCADE from conversations.
+
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_created
+    ON messages(conversation_id, created_at DESC);
@@ -0,0 +1,12 @@
+-- Migration: Trigram indexes for conversation search
+-- /api/conversations/search matches ILIKE '%query%' against conversation
+-- titles and message content. A leading wildcard can't use a btree index,
+-- but pg_trgm GIN indexes serve ILIKE substring matches directly.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_conversations_title_trgm
+    ON conversations USING gin (title gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_messages_content_trgm
+    ON messages USING gin (content gin_trgm_ops);
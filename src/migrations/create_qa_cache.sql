@@ -0,0 +1,26 @@
+-- Migration: semantic answer cache for /api/chat
+-- Stores answers to standalone questions keyed by question embedding so that
+-- near-duplicate questions (same student profile) skip retrieval + generation.
+
+CREATE EXTENSION IF NOT EXISTS vector;
+
+CREATE TABLE IF NOT EXISTS qa_cache (
+    id BIGSERIAL PRIMARY KEY,
+    profile_key TEXT NOT NULL DEFAULT '',
+    question TEXT NOT NULL,
+    embedding vector(1536) NOT NULL,
+    answer TEXT NOT NULL,
+    matches JSONB NOT NULL DEFAULT '[]'::jsonb,
+    model TEXT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+-- Nearest-neighbour lookup on the question embedding
+CREATE INDEX IF NOT EXISTS idx_qa_cache_embedding
+    ON qa_cache USING hnsw (embedding vector_cosine_ops);
+
+CREATE INDEX IF NOT EXISTS idx_qa_cache_profile_key ON qa_cache(profile_key);
+
+-- Lets expired rows be purged cheaply: DELETE FROM qa_cache WHERE expires_at < NOW();
+CREATE INDEX IF NOT EXISTS idx_qa_cache_expires_at ON qa_cache(expires_at);
@@ -19,7 +19,14 @@ fi
 echo "📦 Installing Python dependencies..."
 python3 -m pip install --user -q -r requirements.txt
 
-# Start the Flask server
+# Start the API: gunicorn (multi-worker, threaded) with --prod, otherwise the
+# Flask development server
+if [ "$1" = "--prod" ]; then
+    echo "🎓 Starting gunicorn on port ${PORT:-5001}"
+    echo ""
+    exec python3 -m gunicorn -c gunicorn.conf.py api.app:app
+fi
+
 echo "🎓 Starting Flask API server on http://localhost:5001"
 echo ""
 python3 api/app.py